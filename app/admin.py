@@ -1,15 +1,43 @@
 from django.contrib import admin
 
-from app.models import Question, QuestionLike, AnswerLike, Answer, UserProfile
+from app import signals
+from app.managers import count_subquery
+from app.models import Question, QuestionLike, AnswerLike, Answer, UserProfile, QuestionTag, Tag
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     ...
 
 
+class QuestionTagInline(admin.TabularInline):
+    model = QuestionTag
+    fields = ['tag']
+    raw_id_fields = ['tag']
+    extra = 1
+
+
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
     raw_id_fields = ['author']
+    inlines = [QuestionTagInline]
+
+    def save_formset(self, request, form, formset, change):
+        """Теги вопроса: копия времени создания для ленты тега и счётчики затронутых тегов"""
+        if formset.model is not QuestionTag:
+            return super().save_formset(request, form, formset, change)
+
+        question = form.instance
+        tag_ids = {tag_form.initial['tag'] for tag_form in formset.initial_forms}
+        question_tags = formset.save(commit=False)
+        for question_tag in question_tags:
+            question_tag.question_created_at = question.created_at
+            question_tag.save()
+        for question_tag in formset.deleted_objects:
+            question_tag.delete()
+
+        tag_ids.update(question_tag.tag_id for question_tag in question_tags)
+        Tag.objects.filter(pk__in=tag_ids).update(questions_count=count_subquery(QuestionTag, 'tag'))
+        signals.question_updated.send(sender=Question, question_id=question.pk)
 
 
 @admin.register(Answer)
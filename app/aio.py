@@ -0,0 +1,31 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+
+def _run_in_worker(func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        # У потока из пула своё соединение, и request_finished его не закроет
+        close_old_connections()
+
+
+async def run_query(func, *args, **kwargs):
+    """
+    Синхронная функция с запросами к БД из асинхронного view.
+
+    Асинхронный ORM Django выполняет все запросы запроса последовательно в одном потоке,
+    поэтому при ASYNC_PARALLEL_QUERIES функция уходит в отдельный поток со своим соединением
+    и несколько таких вызовов действительно идут параллельно.
+    """
+    if settings.ASYNC_PARALLEL_QUERIES:
+        return await sync_to_async(_run_in_worker, thread_sensitive=False)(func, *args, **kwargs)
+    return await sync_to_async(func)(*args, **kwargs)
+
+
+async def gather(*calls):
+    """Конкурентный run_query для пар (func, *args), результаты в том же порядке"""
+    return await asyncio.gather(*(run_query(*call) for call in calls))
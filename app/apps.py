@@ -4,3 +4,26 @@ from django.apps import AppConfig
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from django.contrib.auth.signals import user_logged_out
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_save, post_delete
+
+        from app import authcache, conditional, fragments, pagecache, signals
+        from app.metrics import install_query_wrapper
+
+        connection_created.connect(install_query_wrapper, dispatch_uid='app.metrics.install_query_wrapper')
+        signals.question_updated.connect(fragments.on_question_updated, dispatch_uid='app.fragments.question')
+        signals.answer_updated.connect(fragments.on_answer_updated, dispatch_uid='app.fragments.answer')
+        signals.question_created.connect(pagecache.on_question_created, dispatch_uid='app.pagecache.created')
+        signals.question_updated.connect(pagecache.on_question_updated, dispatch_uid='app.pagecache.question')
+        signals.answer_updated.connect(pagecache.on_answer_updated, dispatch_uid='app.pagecache.answer')
+        signals.question_created.connect(conditional.on_question_created, dispatch_uid='app.conditional.created')
+        signals.question_updated.connect(conditional.on_question_updated, dispatch_uid='app.conditional.question')
+        signals.answer_updated.connect(conditional.on_answer_updated, dispatch_uid='app.conditional.answer')
+        post_save.connect(authcache.on_user_changed, sender=User, dispatch_uid='app.authcache.saved')
+        post_save.connect(conditional.on_user_changed, sender=User, dispatch_uid='app.conditional.user')
+        post_delete.connect(authcache.on_user_changed, sender=User, dispatch_uid='app.authcache.deleted')
+        user_logged_out.connect(authcache.on_user_logged_out, dispatch_uid='app.authcache.logged_out')
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from app.models import UserProfile
+
+
+# Путь бэкенда для auth.login: при нескольких AUTHENTICATION_BACKENDS его нужно указывать явно
+BACKEND = 'app.authcache.CachedModelBackend'
+
+
+def user_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend, который берёт пользователя сессии из общего кэша.
+
+    Вместе с кэшируемыми сессиями страница авторизованного пользователя обходится без запросов
+    к БД для аутентификации. Запись сбрасывается при сохранении пользователя, смене его аватарки
+    и при выходе. Хэш аватарки (avatar_hash) для шапки сайта загружается тем же запросом.
+    """
+
+    def user_queryset(self, user_id):
+        """Пользователи с хэшем аватарки user_id в avatar_hash"""
+        return get_user_model()._default_manager.annotate(avatar_hash=UserProfile.objects.avatar_of(user_id))
+
+    def get_user(self, user_id):
+        key = user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = self.user_queryset(user_id).filter(pk=user_id).first()
+            if user is not None:
+                cache.set(key, user, settings.AUTH_USER_CACHE_TTL)
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        key = user_key(user_id)
+        user = await cache.aget(key)
+        if user is None:
+            user = await self.user_queryset(user_id).filter(pk=user_id).afirst()
+            if user is not None:
+                await cache.aset(key, user, settings.AUTH_USER_CACHE_TTL)
+        return user if self.user_can_authenticate(user) else None
+
+
+def forget_user(user_id):
+    cache.delete(user_key(user_id))
+
+
+def on_user_changed(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+def on_user_logged_out(sender, request, user, **kwargs):
+    if user is not None:
+        forget_user(user.pk)
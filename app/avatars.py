@@ -0,0 +1,150 @@
+import hashlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from PIL import Image, UnidentifiedImageError
+
+from app import authcache, conditional, thumbnails
+from app.models import UserProfile
+
+logger = logging.getLogger(__name__)
+
+# Каталог аватарок в MEDIA_ROOT; имена файлов - хэш содержимого, поэтому они не меняются
+AVATAR_DIR = 'avatars'
+
+# Размер в шаблонах -> сторона миниатюры в пикселях (с запасом для экранов с высокой плотностью)
+SIZES = {
+    'small': 80,
+    'medium': 100,
+    'large': 240,
+}
+
+# Формат Pillow -> расширение сохранённого оригинала
+ACCEPTED_FORMATS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'WEBP': 'webp',
+    'GIF': 'gif',
+}
+
+
+def digest_of(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def original_name(digest, extension):
+    return f'{AVATAR_DIR}/{digest[:2]}/{digest}.{extension}'
+
+
+def thumbnail_name(digest, size, extension):
+    return f'{AVATAR_DIR}/{digest[:2]}/{digest}-{size}.{extension}'
+
+
+def urls(digest, size):
+    """URL миниатюры размера size ('small', 'medium', 'large') по форматам: {'webp': ..., 'jpg': ...}"""
+    pixels = SIZES[size]
+    return {
+        extension: default_storage.url(thumbnail_name(digest, pixels, extension))
+        for extension in thumbnails.FORMATS
+    }
+
+
+def validate(upload):
+    """
+    Формат оригинала для загруженного файла; ValidationError, если это не картинка,
+    она больше AVATAR_MAX_UPLOAD_SIZE байт или AVATAR_MAX_SIDE пикселей по стороне.
+    """
+    if upload.size > settings.AVATAR_MAX_UPLOAD_SIZE:
+        raise ValidationError(f'Avatar is too large, the limit is {settings.AVATAR_MAX_UPLOAD_SIZE // 1024} KB.')
+
+    try:
+        with Image.open(upload) as image:
+            image_format, (width, height) = image.format, image.size
+            image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError):
+        raise ValidationError('Avatar must be a JPEG, PNG, WebP or GIF image.')
+    finally:
+        upload.seek(0)
+
+    if image_format not in ACCEPTED_FORMATS:
+        raise ValidationError('Avatar must be a JPEG, PNG, WebP or GIF image.')
+    if max(width, height) > settings.AVATAR_MAX_SIDE:
+        raise ValidationError(f'Avatar must be at most {settings.AVATAR_MAX_SIDE}px on each side.')
+    return image_format
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool():
+    """
+    Процессы для Pillow, общие для всех запросов воркера.
+
+    spawn вместо fork: воркер ASGI многопоточный, а форк такого процесса может унаследовать
+    захваченные блокировки.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.AVATAR_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def save_upload(user_id, upload, image_format):
+    """
+    Сохраняет оригинал под именем из хэша содержимого и ставит миниатюры в очередь.
+
+    Аватарка появляется на карточках, когда готовы все миниатюры (publish); до этого
+    показывается предыдущая. Возвращает хэш.
+    """
+    data = upload.read()
+    digest = digest_of(data)
+
+    name = original_name(digest, ACCEPTED_FORMATS[image_format])
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(data))
+    UserProfile.objects.filter(user_id=user_id).update(avatar=name)
+
+    sizes = tuple(SIZES.values())
+    names = [thumbnail_name(digest, size, extension) for size in sizes for extension in thumbnails.FORMATS]
+    if all(default_storage.exists(name) for name in names):
+        publish(user_id, digest, {})
+    elif settings.AVATAR_WORKERS:
+        future = pool().submit(thumbnails.render, data, sizes)
+        future.add_done_callback(lambda done: _publish_result(user_id, digest, done))
+    else:
+        publish(user_id, digest, thumbnails.render(data, sizes))
+    return digest
+
+
+def _publish_result(user_id, digest, future):
+    try:
+        publish(user_id, digest, future.result())
+    except Exception:
+        logger.exception('Avatar thumbnails for user %s failed', user_id)
+    finally:
+        # Колбэк выполняется в служебном потоке пула, request_finished его соединение не закроет
+        close_old_connections()
+
+
+def publish(user_id, digest, rendered):
+    """Записывает миниатюры {(размер, расширение): байты} и переключает пользователя на новую аватарку"""
+    for (size, extension), content in rendered.items():
+        name = thumbnail_name(digest, size, extension)
+        if not default_storage.exists(name):
+            default_storage.save(name, ContentFile(content))
+    UserProfile.objects.set_avatar(user_id, digest)
+    authcache.forget_user(user_id)
+    # Карточки автора есть на любых страницах
+    conditional.touch(conditional.SITE_SCOPE)
@@ -0,0 +1,16 @@
+import time
+
+from django.db.backends.postgresql import base
+
+from app import metrics
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Стандартный бэкенд PostgreSQL, который пишет в метрики запроса время подключения или ожидания пула"""
+
+    def get_new_connection(self, conn_params):
+        started = time.perf_counter()
+        try:
+            return super().get_new_connection(conn_params)
+        finally:
+            metrics.record_connect(time.perf_counter() - started)
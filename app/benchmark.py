@@ -0,0 +1,320 @@
+import re
+import secrets
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from app import signals
+from app.models import Question, Answer, Tag
+
+SERVER_TIMING_QUERIES_RE = re.compile(r'db;[^,]*desc="(\d+) queries')
+
+# Среднее число запросов на голосование немного плавает из-за конкурирующих голосов
+QUERIES_TOLERANCE = 0.5
+
+# Параметр, с которым страница не берётся из кэша страниц (app.pagecache.KEY_PARAMS его не знает)
+BYPASS_PARAM = 'nocache'
+
+
+def benchmark_host():
+    """Имя хоста из ALLOWED_HOSTS для запросов тестового клиента, иначе ответом будет 400"""
+    for host in settings.ALLOWED_HOSTS:
+        if host and host != '*' and not host.startswith('.'):
+            return host
+    return 'localhost'
+
+
+class Scenario:
+    def __init__(self, name, path, method='GET', data=None, login=False):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.data = data
+        self.login = login
+
+    def uncached(self):
+        """Тот же анонимный GET мимо кэша страниц: измеряется сама view, а не кэш"""
+        separator = '&' if '?' in self.path else '?'
+        return Scenario(f'{self.name}_uncached', f'{self.path}{separator}{BYPASS_PARAM}=1', self.method, self.data)
+
+    def payload(self, iteration):
+        """Данные POST-запроса; голоса чередуются, чтобы состояние БД не уходило в одну сторону"""
+        if callable(self.data):
+            return self.data(iteration)
+        return self.data
+
+
+def build_scenarios():
+    """
+    Сценарии для всех страниц чтения и голосования на текущих данных.
+
+    Анонимные страницы чтения измеряются дважды: из кэша страниц и с BYPASS_PARAM (*_uncached).
+    """
+    question = Question.objects.new_questions().order_by('-answers_count', '-id').first()
+    tag = Tag.objects.order_by('id').first()
+    if question is None or tag is None:
+        raise ValueError('Benchmark needs data, run fill_db first')
+
+    answer = Answer.objects.filter(question=question).order_by('id').first()
+
+    reads = [
+        Scenario('index', reverse('app:index')),
+        Scenario('index_deep', reverse('app:index') + '?page=50'),
+        Scenario('hot', reverse('app:hot')),
+        Scenario('tag', reverse('app:tag', kwargs={'tag_name': tag.name})),
+        Scenario('question', reverse('app:question', kwargs={'question_id': question.id})),
+    ]
+    scenarios = [
+        *reads,
+        *(scenario.uncached() for scenario in reads),
+        Scenario('search', reverse('app:search') + '?q=lorem'),
+        Scenario(
+            'vote_question', reverse('app:vote_question', kwargs={'question_id': question.id}), 'POST',
+            lambda i: {'vote_type': 'up_a' if i % 2 == 0 else 'down_a'}, login=True
+        ),
+    ]
+    if answer is not None:
+        scenarios.append(Scenario(
+            'vote_answer', reverse('app:vote_answer', kwargs={'answer_id': answer.id}), 'POST',
+            lambda i: {'vote_type': 'up' if i % 2 == 0 else 'down'}, login=True
+        ))
+    scenarios.append(Scenario(
+        'answer', reverse('app:question', kwargs={'question_id': question.id}), 'POST',
+        lambda i: {'content': f'Benchmark answer {i}'}, login=True
+    ))
+    return scenarios
+
+
+def grow_thread(answers_count, batch_size=1000):
+    """
+    Догоняет вопрос с наибольшим числом ответов до answers_count ответов.
+
+    Лайки новых ответов разные, чтобы место ответа в best_answers зависело от индекса, а не от id.
+    """
+    question = Question.objects.new_questions().order_by('-answers_count', '-id').first()
+    users = list(User.objects.values_list('id', flat=True)[:100])
+    if question is None or not users:
+        raise ValueError('Benchmark needs data, run fill_db first')
+
+    missing = answers_count - Answer.all_objects.filter(question=question).count()
+    if missing <= 0:
+        return question
+
+    Answer.all_objects.bulk_create(
+        [
+            Answer(
+                question=question, author_id=users[i % len(users)], content=f'Long thread answer {i}',
+                likes_count=i % 50, rating=i % 50,
+            )
+            for i in range(missing)
+        ],
+        batch_size=batch_size,
+    )
+    Question.objects.add_answers(question, missing)
+    signals.question_updated.send(sender=Question, question_id=question.pk)
+    return question
+
+
+def queries_from_response(headers):
+    match = SERVER_TIMING_QUERIES_RE.search(headers.get('Server-Timing', ''))
+    return int(match.group(1)) if match else None
+
+
+class ClientDriver:
+    """Запросы через django.test.Client, по клиенту на поток"""
+    mode = 'client'
+
+    def __init__(self, user):
+        self.user = user
+        self.local = threading.local()
+
+    def client(self, login):
+        attr = 'auth_client' if login else 'anon_client'
+        client = getattr(self.local, attr, None)
+        if client is None:
+            client = Client(HTTP_HOST=benchmark_host())
+            if login:
+                client.force_login(self.user)
+            setattr(self.local, attr, client)
+        return client
+
+    def request(self, scenario, iteration):
+        client = self.client(scenario.login)
+        if scenario.method == 'POST':
+            response = client.post(scenario.path, scenario.payload(iteration))
+        else:
+            response = client.get(scenario.path)
+        return response.status_code, queries_from_response(response)
+
+    def close(self):
+        pass
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class NoRedirectHandler(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class ServerDriver:
+    """
+    Запросы по HTTP к локальному WSGI-серверу в фоновом потоке
+    или к уже запущенному серверу по base_url (например, ASGI-воркерам).
+    """
+    mode = 'server'
+
+    def __init__(self, user, base_url=None):
+        self.server = None
+        if base_url is None:
+            self.server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+            self.server.set_app(get_internal_wsgi_application())
+            self.server.daemon_threads = True
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            base_url = f'http://127.0.0.1:{self.server.server_port}'
+        self.base_url = base_url.rstrip('/')
+
+        client = Client()
+        client.force_login(user)
+        self.csrf_token = secrets.token_hex(16)
+        self.auth_cookies = {
+            settings.SESSION_COOKIE_NAME: client.cookies[settings.SESSION_COOKIE_NAME].value,
+            settings.CSRF_COOKIE_NAME: self.csrf_token,
+        }
+
+    def request(self, scenario, iteration):
+        headers = {}
+        body = None
+        if scenario.login:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.auth_cookies.items())
+            headers['X-CSRFToken'] = self.csrf_token
+        if scenario.method == 'POST':
+            body = urllib.parse.urlencode(scenario.payload(iteration)).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        request = urllib.request.Request(self.base_url + scenario.path, body, headers, method=scenario.method)
+        opener = urllib.request.build_opener(NoRedirectHandler)
+        try:
+            with opener.open(request) as response:
+                response.read()
+                return response.status, queries_from_response(response.headers)
+        except urllib.error.HTTPError as error:
+            return error.code, queries_from_response(error.headers)
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def percentile(sorted_values, p):
+    """Перцентиль методом ближайшего ранга"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def run_scenario(driver, scenario, requests, concurrency):
+    latencies = []
+    queries = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(iteration):
+        nonlocal errors
+        started = time.perf_counter()
+        status, query_count = driver.request(scenario, iteration)
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if query_count is not None:
+                queries.append(query_count)
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, range(requests)))
+    else:
+        for iteration in range(requests):
+            one(iteration)
+    wall_time = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'throughput_rps': round(requests / wall_time, 2) if wall_time else None,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def run_benchmark(driver, scenarios, requests=50, concurrency=1, warmup=3):
+    """Прогон всех сценариев; результат готов к сохранению в JSON"""
+    routes = {}
+    for scenario in scenarios:
+        for iteration in range(warmup):
+            driver.request(scenario, iteration)
+        routes[scenario.name] = run_scenario(driver, scenario, requests, concurrency)
+
+    return {
+        'meta': {
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'mode': driver.mode,
+            'requests': requests,
+            'concurrency': concurrency,
+            'dataset': {
+                'users': User.objects.count(),
+                'questions': Question.all_objects.count(),
+                'answers': Answer.all_objects.count(),
+            },
+        },
+        'routes': routes,
+    }
+
+
+def compare(report, baseline, threshold=0.2):
+    """
+    Регрессии относительно baseline: появились ошибки, p95 выросло больше чем на threshold
+    или стало больше запросов.
+
+    Ответ с ошибкой обычно быстрее настоящей страницы, поэтому ошибки проверяются первыми.
+    """
+    regressions = []
+    for name, current in report['routes'].items():
+        if current['errors']:
+            regressions.append(f'{name}: {current["errors"]} of {current["requests"]} requests failed')
+
+        previous = baseline.get('routes', {}).get(name)
+        if previous is None:
+            continue
+
+        if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+            regressions.append(f'{name}: p95 {previous["p95_ms"]}ms -> {current["p95_ms"]}ms')
+
+        if (current['queries_per_request'] or 0) > (previous['queries_per_request'] or 0) + QUERIES_TOLERANCE:
+            regressions.append(
+                f'{name}: queries/request {previous["queries_per_request"]} -> {current["queries_per_request"]}'
+            )
+    return regressions
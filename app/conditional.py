@@ -0,0 +1,122 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+# Лента (index, hot, tag): меняется с любым вопросом на ней или новым вопросом
+FEED_SCOPE = 'feed'
+# Изменения, видные на всех страницах сразу, например новая аватарка пользователя
+SITE_SCOPE = 'site'
+
+# Заголовки версии страницы, которые сохраняются вместе с ней в кэше страниц
+HEADERS = ('ETag', 'Last-Modified')
+
+
+def question_scope(question_id):
+    return f'question:{question_id}'
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def changed_key(scope):
+    return f'conditional:changed:{scope}'
+
+
+def touch(*scopes):
+    """Отметка времени изменения областей: ETag и Last-Modified их страниц меняются"""
+    now = time.time()
+    cache.set_many({changed_key(scope): now for scope in scopes}, None)
+
+
+def changed_at(*scopes):
+    """
+    Время последнего изменения каждой области одним get_many.
+
+    Вытесненная из кэша отметка считается изменением сейчас: страница один раз отдастся
+    целиком, но устаревшей не окажется.
+    """
+    keys = [changed_key(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    now = time.time()
+    for key in keys:
+        if key not in values:
+            cache.add(key, now, None)
+            values[key] = cache.get(key, now)
+    return [values[key] for key in keys]
+
+
+def is_conditional(request):
+    return 'if-none-match' in request.headers or 'if-modified-since' in request.headers
+
+
+def identity(request):
+    """
+    Кто смотрит страницу, без загрузки сессии: от cookie сессии зависят пользователь и его лайки.
+
+    У анонимных посетителей ETag общий, поэтому его можно хранить в кэше страниц. CSRF-cookie
+    в него не входит: она меняется вместе с сессией при входе, а в остальное время постоянна.
+    """
+    return request.COOKIES.get(settings.SESSION_COOKIE_NAME, '')
+
+
+async def aviewer_scopes(request):
+    """
+    Область вошедшего пользователя: его имя есть в шапке каждой страницы.
+
+    Читается только id из сессии, без загрузки самого пользователя.
+    """
+    user_id = await request.session.aget(SESSION_KEY)
+    return [] if user_id is None else [user_scope(user_id)]
+
+
+class Validators:
+    """ETag и Last-Modified страницы по отметкам изменений её областей и времени правки её объекта"""
+
+    def __init__(self, request, changed, updated_at=None, *parts):
+        stamps = list(changed)
+        if updated_at is not None:
+            stamps.append(updated_at.timestamp())
+        value = '|'.join(str(part) for part in (request.get_full_path(), identity(request), *stamps, *parts))
+        self.etag = f'W/"{hashlib.md5(value.encode()).hexdigest()}"'
+        self.last_modified = int(max(stamps))
+
+    def not_modified(self, request):
+        """Ответ 304, если у клиента эта версия страницы, иначе None"""
+        if CookieStorage.cookie_name in request.COOKIES:
+            # Одноразовые сообщения показываются только в полном ответе
+            return None
+        response = get_conditional_response(request, self.etag, self.last_modified)
+        return None if response is None else self.apply(request, response)
+
+    def apply(self, request, response):
+        if CookieStorage.cookie_name in request.COOKIES:
+            return response
+        response['ETag'] = self.etag
+        response['Last-Modified'] = http_date(self.last_modified)
+        # Без явного max-age браузер счёл бы страницу свежей по эвристике Last-Modified
+        if 'max-age' not in response.get('Cache-Control', ''):
+            patch_cache_control(response, private=True, max_age=0)
+        return response
+
+
+def on_question_created(sender, question, **kwargs):
+    touch(FEED_SCOPE)
+
+
+def on_question_updated(sender, question_id, **kwargs):
+    touch(FEED_SCOPE, question_scope(question_id))
+
+
+def on_answer_updated(sender, answer_id, question_id, **kwargs):
+    touch(question_scope(question_id))
+
+
+def on_user_changed(sender, instance, **kwargs):
+    touch(user_scope(instance.pk))
@@ -0,0 +1,80 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+
+class Total:
+    """Число объектов для пагинации; estimated - оценка планировщика, а не COUNT(*)"""
+
+    def __init__(self, value, estimated=False):
+        self.value = value
+        self.estimated = estimated
+
+    def __repr__(self):
+        return f'<Total {"~" if self.estimated else ""}{self.value}>'
+
+
+def count_key(queryset):
+    sql, params = queryset.order_by().query.sql_with_params()
+    return f'count:{hashlib.md5(f"{sql}:{params}".encode()).hexdigest()}'
+
+
+def planner_estimate(queryset):
+    """
+    Число строк по оценке планировщика PostgreSQL (EXPLAIN), None на других БД.
+
+    Для таблицы без условий это reltuples из статистики, для фильтров - оценка селективности.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    sql, params = queryset.order_by().query.get_compiler(connection=connection).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count(queryset):
+    """
+    Total для пагинации queryset по PAGINATION_COUNT_MODE.
+
+    exact - COUNT(*) на каждый запрос; cached - COUNT(*), закэшированный на PAGINATION_COUNT_TTL;
+    auto - как cached, но на PostgreSQL наборы больше PAGINATION_ESTIMATE_THRESHOLD строк
+    не считаются, а берутся из оценки планировщика.
+    """
+    if queryset.query.is_empty():
+        # У .none() нет SQL, из которого строится ключ кэша
+        return Total(0)
+
+    mode = settings.PAGINATION_COUNT_MODE
+    if mode == 'exact':
+        return Total(queryset.count())
+
+    key = count_key(queryset)
+    total = cache.get(key)
+    if total is not None:
+        return total
+
+    if mode == 'auto':
+        estimate = planner_estimate(queryset)
+        if estimate is not None and estimate >= settings.PAGINATION_ESTIMATE_THRESHOLD:
+            total = Total(estimate, estimated=True)
+    if total is None:
+        total = Total(queryset.count())
+
+    cache.set(key, total, settings.PAGINATION_COUNT_TTL)
+    return total
+
+
+def recount(queryset):
+    """Точный COUNT(*) вместо оценки, например когда последняя страница по оценке оказалась пустой"""
+    total = Total(queryset.count())
+    cache.set(count_key(queryset), total, settings.PAGINATION_COUNT_TTL)
+    return total
@@ -0,0 +1,63 @@
+import re
+
+from app.models import Question, Answer, Tag, QuestionTag, QuestionLike, AnswerLike, UserProfile
+
+# Полный просмотр таблицы в плане: SQLite - SCAN без индекса, PostgreSQL - Seq Scan
+SEQ_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (\w+)(?! USING)(?:\s*$)', re.MULTILINE),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+
+# Сортировка всего результата вместо чтения в порядке индекса
+SORT_PATTERNS = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR ORDER BY'),
+    'postgresql': re.compile(r'\bSort\b'),
+}
+
+# Размер страницы в запросах: планы строятся для тех же LIMIT, что и у view
+PAGE_SIZE = 20
+
+
+def manager_queries():
+    """
+    Запросы каждого метода QuestionManager, QuestionTagManager и AnswerManager на текущих данных.
+
+    Возвращает пары (имя, queryset); параметры берутся из самых наполненных вопроса и тегов.
+    """
+    question = Question.objects.order_by('-answers_count', '-id').first()
+    answer = Answer.objects.filter(question=question).first()
+    tags = list(Tag.objects.order_by('-questions_count')[:2])
+    user_id = UserProfile.objects.values_list('user_id', flat=True).first()
+    if answer is None or not tags:
+        raise ValueError('Queries need data, run fill_db first')
+
+    return [
+        ('QuestionManager.best_questions', Question.objects.best_questions()[:PAGE_SIZE]),
+        ('QuestionManager.new_questions', Question.objects.new_questions()[:PAGE_SIZE]),
+        ('QuestionManager.hot_questions', Question.objects.hot_questions()[:PAGE_SIZE]),
+        ('QuestionManager.unanswered_questions', Question.objects.unanswered_questions()[:PAGE_SIZE]),
+        ('QuestionManager.with_tags', Question.objects.with_tags([tag.name for tag in tags])[:PAGE_SIZE]),
+        ('QuestionManager.with_all_tags', Question.objects.with_all_tags(tags)[:PAGE_SIZE]),
+        ('QuestionManager.with_user_activity', Question.objects.with_user_activity()[:PAGE_SIZE]),
+        ('QuestionTagManager.feed', QuestionTag.objects.feed(tags[0])[:PAGE_SIZE]),
+        ('AnswerManager.best_answers', Answer.objects.filter(question=question).best_answers()[:PAGE_SIZE]),
+        ('AnswerManager.for_question', Answer.objects.for_question(question.pk)[:PAGE_SIZE]),
+        ('AnswerManager.best_rank', Answer.objects.ranked_above(answer).values('id')),
+        ('QuestionLike by question', QuestionLike.objects.filter(question=question).values('id')),
+        ('AnswerLike by answer', AnswerLike.objects.filter(answer=answer).values('id')),
+        ('QuestionLike by viewer', QuestionLike.objects.filter(user_id=user_id, question_id__in=[question.pk])),
+        ('UserProfileManager.best_members', UserProfile.objects.best_members(5)),
+    ]
+
+
+def seq_scans(plan, vendor):
+    """Таблицы, которые план читает целиком"""
+    pattern = SEQ_SCAN_PATTERNS.get(vendor)
+    if pattern is None:
+        return []
+    return pattern.findall(plan)
+
+
+def sorts(plan, vendor):
+    pattern = SORT_PATTERNS.get(vendor)
+    return bool(pattern and pattern.search(plan))
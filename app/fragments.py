@@ -0,0 +1,126 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from app import viewer
+
+# Метки в закэшированной разметке, вместо которых подставляются данные конкретного запроса.
+# Шаблоны экранируют '<' и '>' в пользовательском тексте, поэтому в нём меток быть не может;
+# сами метки безопасные строки и выводятся как есть
+CSRF_SENTINEL = mark_safe('<__csrf_token__>')
+LIKED_SENTINEL = mark_safe('<__liked__>')
+LIKED_CLASS = ' voted'
+
+
+def author_name(obj):
+    return obj.author.username if obj.author_id else ''
+
+
+class CardKind:
+    """Карточка объекта в ленте: шаблон, что меняет её разметку и чем её дозагрузить перед рендерингом"""
+    kind = None
+    template_name = None
+    prefetch = ()
+
+    def state(self, obj):
+        """Счётчики, имя и аватарка автора входят в ключ, так что карточка не покажет устаревшее даже без смены версии"""
+        return obj.likes_count, author_name(obj), obj.author_avatar
+
+    def render(self, obj, variant):
+        return render_to_string(self.template_name, {
+            self.kind: obj,
+            'detailed': variant == 'detailed',
+            'csrf_token': CSRF_SENTINEL,
+            'liked_class': LIKED_SENTINEL,
+        })
+
+
+class QuestionCard(CardKind):
+    kind = 'question'
+    template_name = 'components/question_item.html'
+    prefetch = ('tags',)
+
+    def state(self, obj):
+        return obj.likes_count, obj.answers_count, author_name(obj), obj.author_avatar
+
+
+class AnswerCard(CardKind):
+    kind = 'answer'
+    template_name = 'components/answer_item.html'
+
+
+QUESTION_CARD = QuestionCard()
+ANSWER_CARD = AnswerCard()
+
+
+def version_key(kind, object_id):
+    return f'fragment:version:{kind}:{object_id}'
+
+
+def fragment_key(card, obj, variant, version):
+    state = ':'.join(str(value) for value in card.state(obj))
+    return f'fragment:{card.kind}:{variant}:{obj.pk}:{version}:{state}'
+
+
+def bump(kind, object_id):
+    """Новая версия карточки: старые фрагменты больше не читаются и вытесняются по TTL"""
+    key = version_key(kind, object_id)
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def render_cards(request, card, objects, variant='list'):
+    """
+    HTML карточек objects в том же порядке.
+
+    Версии и готовые фрагменты читаются двумя get_many, рендерятся только промахи
+    (для них же дозагружаются связанные объекты). CSRF-токен и отметка лайка
+    подставляются в разметку для каждого запроса; отметку лайка view обычно уже проставил
+    через viewer.overlay, для остальных объектов она загружается здесь.
+    """
+    objects = list(objects)
+    if not objects:
+        return []
+
+    versions = cache.get_many([version_key(card.kind, obj.pk) for obj in objects])
+    keys = {
+        obj.pk: fragment_key(card, obj, variant, versions.get(version_key(card.kind, obj.pk), 0))
+        for obj in objects
+    }
+
+    fragments = cache.get_many(list(keys.values()))
+    missing = [obj for obj in objects if keys[obj.pk] not in fragments]
+    if missing:
+        if card.prefetch:
+            prefetch_related_objects(missing, *card.prefetch)
+        rendered = {keys[obj.pk]: card.render(obj, variant) for obj in missing}
+        cache.set_many(rendered, settings.FRAGMENT_CACHE_TTL)
+        fragments.update(rendered)
+
+    # Для кэша страниц токен подставит PageCacheMiddleware
+    token = CSRF_SENTINEL if getattr(request, 'page_cache_key', None) else get_token(request)
+    without_state = [obj for obj in objects if not hasattr(obj, 'viewer_liked')]
+    if without_state:
+        viewer.overlay(request.user, **{card.kind: without_state})
+    return [
+        mark_safe(
+            fragments[keys[obj.pk]]
+            .replace(CSRF_SENTINEL, token)
+            .replace(LIKED_SENTINEL, LIKED_CLASS if obj.viewer_liked else '')
+        )
+        for obj in objects
+    ]
+
+
+def on_question_updated(sender, question_id, **kwargs):
+    bump(QUESTION_CARD.kind, question_id)
+
+
+def on_answer_updated(sender, answer_id, **kwargs):
+    bump(ANSWER_CARD.kind, answer_id)
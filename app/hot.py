@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Max
+from django.utils import timezone
+
+
+def decay_weight(created_at, now=None):
+    """Вес одного очка рейтинга для вопроса возраста now - created_at (формула Hacker News)"""
+    now = now or timezone.now()
+    age_hours = max(0.0, (now - created_at).total_seconds() / 3600)
+    return 1 / (age_hours + 2) ** settings.HOT_GRAVITY
+
+
+def hot_score(rating, created_at, now=None):
+    return rating * decay_weight(created_at, now)
+
+
+def hot_increment(delta, created_at):
+    """
+    Выражение для UPDATE, добавляющее к сохранённой горячести вклад delta очков рейтинга.
+
+    Между пересчётами оценка приблизительна, точное значение восстанавливает decay_hot_scores.
+    """
+    return F('hot_score') + delta * decay_weight(created_at)
+
+
+def redecay(questions, chunk_size=1000, max_age=None):
+    """Пересчёт горячести вопросов диапазонами id; max_age ограничивает пересчёт свежими вопросами"""
+    now = timezone.now()
+    if max_age is not None:
+        questions = questions.filter(created_at__gte=now - max_age)
+
+    max_id = questions.aggregate(max_id=Max('id'))['max_id'] or 0
+    updated = 0
+
+    for start in range(0, max_id + 1, chunk_size):
+        chunk = list(questions.filter(id__gte=start, id__lt=start + chunk_size).only('id', 'rating', 'created_at'))
+        for question in chunk:
+            question.hot_score = hot_score(question.rating, question.created_at, now)
+        updated += questions.model.all_objects.bulk_update(chunk, ['hot_score'])
+
+    return updated
+
+
+def default_window():
+    return timedelta(days=settings.HOT_WINDOW_DAYS)
@@ -0,0 +1,77 @@
+import json
+import logging
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from app.benchmark import ClientDriver, ServerDriver, build_scenarios, compare, grow_thread, run_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every route and report latency percentiles, throughput and queries per request as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fill', type=int, default=None, help='Seed the database with fill_db RATIO first')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed passed to fill_db')
+        parser.add_argument('--long-thread', type=int, default=None,
+                            help='Grow the most answered question to this many answers first (e.g. 10000)')
+        parser.add_argument('--mode', choices=['client', 'server'], default='client',
+                            help='Django test client or HTTP against a local WSGI server')
+        parser.add_argument('--url', default=None, help='Base URL of an already running server (server mode)')
+        parser.add_argument('--requests', type=int, default=50, help='Measured requests per route')
+        parser.add_argument('--concurrency', type=int, default=4, help='Concurrent workers per route')
+        parser.add_argument('--warmup', type=int, default=3, help='Unmeasured requests per route')
+        parser.add_argument('--routes', default=None, help='Comma separated route names to run')
+        parser.add_argument('--output', default=None, help='Write the JSON report to this file')
+        parser.add_argument('--baseline', default=None, help='Compare with a previously saved JSON report')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Allowed p95 slowdown vs baseline')
+
+    def handle(self, *args, **options):
+        if options['fill']:
+            call_command('fill_db', options['fill'], seed=options['seed'], stdout=StringIO())
+        if options['long_thread']:
+            grow_thread(options['long_thread'])
+
+        # Метрики берутся из заголовка Server-Timing, построчный лог каждого запроса здесь только мешает
+        logging.getLogger('app.metrics').setLevel(logging.WARNING)
+
+        user = User.objects.order_by('id').first()
+        if user is None:
+            raise CommandError('No users found, run with --fill or fill_db first')
+
+        scenarios = build_scenarios()
+        if options['routes']:
+            names = set(options['routes'].split(','))
+            scenarios = [scenario for scenario in scenarios if scenario.name in names]
+
+        if options['mode'] == 'server':
+            driver = ServerDriver(user, options['url'])
+        else:
+            driver = ClientDriver(user)
+
+        try:
+            report = run_benchmark(
+                driver, scenarios,
+                requests=options['requests'],
+                concurrency=options['concurrency'],
+                warmup=options['warmup'],
+            )
+        finally:
+            driver.close()
+
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+
+            regressions = compare(report, baseline, options['threshold'])
+            if regressions:
+                raise CommandError('Performance regressions:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against baseline'))
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from app import conditional
+from app.hot import default_window, redecay
+from app.models import Question
+
+
+class Command(BaseCommand):
+    help = 'Recompute time-decayed hot scores; run periodically (e.g. every few minutes from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Questions updated per batch')
+        parser.add_argument('--max-age-days', type=int, default=None,
+                            help='Only recompute questions younger than this (default HOT_WINDOW_DAYS)')
+        parser.add_argument('--all', action='store_true', help='Recompute every question regardless of age')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            max_age = None
+        elif options['max_age_days'] is not None:
+            max_age = timedelta(days=options['max_age_days'])
+        else:
+            max_age = default_window()
+
+        updated = redecay(Question.all_objects.all(), options['chunk_size'], max_age)
+        # Порядок /hot/ поменялся без изменения самих вопросов
+        conditional.touch(conditional.FEED_SCOPE)
+        self.stdout.write(self.style.SUCCESS(f'Hot scores recomputed: {updated}'))
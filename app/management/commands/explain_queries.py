@@ -0,0 +1,48 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from app.explain import manager_queries, seq_scans, sorts
+
+
+class Command(BaseCommand):
+    help = 'Print EXPLAIN plans for every QuestionManager/AnswerManager query shape and flag sequential scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fill', type=int, default=None, help='Seed the database with fill_db RATIO first')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed passed to fill_db')
+        parser.add_argument('--analyze', action='store_true', help='Run EXPLAIN ANALYZE (PostgreSQL only)')
+        parser.add_argument('--fail-on-seq-scan', action='store_true', help='Exit with an error if any plan scans a table')
+
+    def handle(self, *args, **options):
+        if options['fill']:
+            call_command('fill_db', options['fill'], seed=options['seed'], stdout=StringIO())
+
+        try:
+            queries = manager_queries()
+        except ValueError as error:
+            raise CommandError(error)
+
+        explain_options = {'analyze': True} if options['analyze'] and connection.vendor == 'postgresql' else {}
+        flagged = []
+        for name, queryset in queries:
+            plan = queryset.explain(**explain_options)
+            scanned = seq_scans(plan, connection.vendor)
+
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for line in plan.splitlines():
+                self.stdout.write(f'    {line}')
+            if scanned:
+                flagged.append(name)
+                self.stdout.write(self.style.ERROR(f'    seq scan: {", ".join(scanned)}'))
+            if sorts(plan, connection.vendor):
+                self.stdout.write(self.style.WARNING('    sorts the result instead of reading an index in order'))
+
+        if flagged and options['fail_on_seq_scan']:
+            raise CommandError(f'Sequential scans in: {", ".join(flagged)}')
+        if flagged:
+            self.stdout.write(self.style.WARNING(f'Sequential scans in {len(flagged)} of {len(queries)} queries'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'No sequential scans in {len(queries)} queries'))
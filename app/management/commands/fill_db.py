@@ -1,40 +1,261 @@
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
-from app.models import Question, UserProfile, Answer, Tag, QuestionLike, AnswerLike
-import random
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from app.models import Question, QuestionTag, UserProfile, Answer, Tag, QuestionLike, AnswerLike
 
 FAKE_QUESTION_CONTENT = """
 Lorem ipsum dolor sit amet consectetur adipisicing elit. Ab reiciendis
-architecto temporibus exercitationem error dolores nihil cumque unde 
+architecto temporibus exercitationem error dolores nihil cumque unde
 iste eos! Maiores iste voluptatem quia tempore ullam accusantium est,
 provident odit?
 """
 
 FAKE_ANSWER_CONTENT = """
 Lorem ipsum dolor sit amet consectetur adipisicing elit. Ab reiciendis
-architecto temporibus exercitationem error dolores nihil cumque unde 
+architecto temporibus exercitationem error dolores nihil cumque unde
 iste eos! Maiores iste voluptatem quia tempore ullam accusantium est,
 provident odit?
 """
 
+# Разброс времени создания вопросов и ответов, чтобы ленты и рейтинги выглядели правдоподобно
+CREATED_AT_SPREAD = timedelta(days=365)
+
+
+class IdPool:
+    """Набор id строк: непрерывный диапазон или, если в нём есть дыры, явный список"""
+
+    def __init__(self, start=0, stop=0, ids=None):
+        self.start = start
+        self.stop = stop
+        self.ids = ids
+
+    @classmethod
+    def for_new_rows(cls, model, max_id_before, inserted):
+        max_id_after = model.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        pool = cls(max_id_before + 1, max_id_after + 1)
+        if len(pool) != inserted:
+            pool = cls(ids=list(model.objects.filter(id__gt=max_id_before).values_list('id', flat=True)))
+        return pool
+
+    def __len__(self):
+        return len(self.ids) if self.ids is not None else self.stop - self.start
+
+    def __getitem__(self, index):
+        return self.ids[index] if self.ids is not None else self.start + index
+
+    def choice(self, rng):
+        return self[rng.randrange(len(self))]
+
+    def sample(self, rng, k):
+        population = self.ids if self.ids is not None else range(self.start, self.stop)
+        return rng.sample(population, min(k, len(population)))
+
+
+def max_id(model):
+    return model.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+
+
+def random_created_at(rng, now):
+    return now - timedelta(seconds=rng.uniform(0, CREATED_AT_SPREAD.total_seconds()))
+
+
+def prepare_rows(model, fields, rows):
+    """
+    Колонки и значения для прямой вставки в таблицу model.
+
+    Незаданные поля заполняются значениями по умолчанию, auto_now поля - текущим временем.
+    """
+    now = timezone.now()
+    concrete = [field for field in model._meta.concrete_fields if not field.primary_key]
+    positions = {name: i for i, name in enumerate(fields)}
+
+    columns = [field.column for field in concrete]
+    prepared = []
+    for row in rows:
+        values = []
+        for field in concrete:
+            if field.attname in positions:
+                value = row[positions[field.attname]]
+            elif getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                value = now
+            else:
+                value = field.get_default()
+            values.append(field.get_db_prep_save(value, connection))
+        prepared.append(values)
+
+    return columns, prepared
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def insert_rows(model, fields, rows):
+    """Вставка строк через COPY на PostgreSQL или пакетным INSERT на остальных СУБД"""
+    if not rows:
+        return 0
+
+    columns, values = prepare_rows(model, fields, rows)
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    column_list = ', '.join(quote(column) for column in columns)
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            buffer = StringIO()
+            for row in values:
+                buffer.write('\t'.join(copy_value(value) for value in row))
+                buffer.write('\n')
+            sql = f'COPY {table} ({column_list}) FROM STDIN'
+            if hasattr(cursor, 'copy_expert'):
+                buffer.seek(0)
+                cursor.copy_expert(sql, buffer)
+            else:
+                with cursor.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+        else:
+            placeholders = ', '.join(['%s'] * len(columns))
+            cursor.executemany(f'INSERT INTO {table} ({column_list}) VALUES ({placeholders})', values)
+
+    return len(values)
+
+
+def generate_users(rng, start, stop, context):
+    for i in range(start, stop):
+        username = f'user_{context["offset"] + i + 1}'
+        yield username, f'{username}@example.com', 'testpassword123'
+
+
+def generate_profiles(rng, start, stop, context):
+    users = context['users']
+    for i in range(start, stop):
+        yield users[i], None
+
+
+def generate_tags(rng, start, stop, context):
+    for i in range(start, stop):
+        yield (f'tag_{context["offset"] + i + 1}',)
+
+
+def generate_questions(rng, start, stop, context):
+    users = context['users']
+    for i in range(start, stop):
+        created_at = random_created_at(rng, context['now'])
+        yield (
+            f'Question #{context["offset"] + i + 1}', FAKE_QUESTION_CONTENT,
+            users.choice(rng), created_at, created_at, True
+        )
+
+
+def generate_question_tags(rng, start, stop, context):
+    questions, tags = context['questions'], context['tags']
+    created_at = dict(
+        Question.all_objects.filter(id__gte=questions[start], id__lte=questions[stop - 1]).values_list('id', 'created_at')
+    )
+    for i in range(start, stop):
+        question_id = questions[i]
+        for tag_id in tags.sample(rng, rng.randint(1, 5)):
+            yield question_id, tag_id, created_at[question_id]
+
+
+def generate_answers(rng, start, stop, context):
+    users, questions = context['users'], context['questions']
+    for i in range(start, stop):
+        created_at = random_created_at(rng, context['now'])
+        yield FAKE_ANSWER_CONTENT, users.choice(rng), questions.choice(rng), created_at, created_at, True
+
+
+def generate_likes(rng, start, stop, context):
+    """Лайки раскладываются по объектам, у каждого объекта свои пользователи без повторов"""
+    users, objects = context['users'], context['objects']
+    per_object, remainder = divmod(context['count'], len(objects))
+    for i in range(start, stop):
+        likes = per_object + (1 if i < remainder else 0)
+        for user_id in users.sample(rng, likes):
+            yield objects[i], user_id
+
+
+STAGES = {
+    'users': (User, ('username', 'email', 'password'), generate_users),
+    'profiles': (UserProfile, ('user_id', 'avatar'), generate_profiles),
+    'tags': (Tag, ('name',), generate_tags),
+    'questions': (
+        Question, ('title', 'content', 'author_id', 'created_at', 'updated_at', 'is_active'), generate_questions
+    ),
+    'question_tags': (QuestionTag, ('question_id', 'tag_id', 'question_created_at'), generate_question_tags),
+    'answers': (
+        Answer, ('content', 'author_id', 'question_id', 'created_at', 'updated_at', 'is_active'), generate_answers
+    ),
+    'question_likes': (QuestionLike, ('question_id', 'user_id'), generate_likes),
+    'answer_likes': (AnswerLike, ('answer_id', 'user_id'), generate_likes),
+}
+
+
+def run_job(job):
+    """Генерация и вставка одного куска строк; выполняется в процессе пула"""
+    stage, chunk_no, start, stop, seed, context = job
+    model, fields, generate = STAGES[stage]
+    rng = random.Random(f'{seed}:{stage}:{chunk_no}')
+
+    with transaction.atomic():
+        return insert_rows(model, fields, list(generate(rng, start, stop, context)))
+
 
 class Command(BaseCommand):
     help = 'Fill database with test data'
 
     def add_arguments(self, parser):
         parser.add_argument('ratio', type=int, help='Ratio for generating data', default=10000)
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible data')
+        parser.add_argument('--workers', type=int, default=1, help='Parallel worker processes')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Rows generated and inserted per job')
 
     def handle(self, *args, **options):
         ratio = options['ratio']
+        self.seed = options['seed'] if options['seed'] is not None else random.randrange(2 ** 32)
+        self.workers = max(1, options['workers'])
+        self.chunk_size = max(1, options['chunk_size'])
+
+        if self.workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite does not support parallel writers, using 1 worker'))
+            self.workers = 1
 
-        self.stdout.write(f'Starting database fill with ratio: {ratio}')
+        self.stdout.write(f'Starting database fill with ratio: {ratio}, seed: {self.seed}, workers: {self.workers}')
 
-        users_count = self.create_users(ratio)
-        tags_count = self.create_tags(ratio)
-        questions_count = self.create_questions(ratio * 10)
-        answers_count = self.create_answers(ratio * 100)
-        question_likes_count = self.create_question_likes(ratio * 200)
-        answer_likes_count = self.create_answer_likes(ratio * 200)
+        now = timezone.now().astimezone(dt_timezone.utc)
+
+        users_count, users = self.create_users(ratio)
+        tags_count, tags = self.create_tags(ratio)
+        questions_count, questions = self.create_questions(ratio * 10, users, tags, now)
+        answers_count, answers = self.create_answers(ratio * 100, users, questions, now)
+        question_likes_count = self.create_likes('question_likes', ratio * 200, users, questions)
+        answer_likes_count = self.create_likes('answer_likes', ratio * 200, users, answers)
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        call_command('recount_counters', stdout=self.stdout)
+        call_command('recount_reputation', stdout=self.stdout)
+        call_command('decay_hot_scores', all=True, stdout=self.stdout)
+        call_command('rebuild_sidebar', stdout=self.stdout)
+        call_command('rebuild_search_index', stdout=self.stdout)
 
         self.stdout.write(
             self.style.SUCCESS(
@@ -48,144 +269,71 @@ class Command(BaseCommand):
             )
         )
 
-    def create_users(self, count):
-        """Создание пользователей и их профилей"""
-        existing_count = User.objects.count()
-        users = []
-        user_profiles = []
-
-        for i in range(count):
-            username = f'user_{existing_count + i + 1}'
-            email = f'{username}@example.com'
-
-            user = User(
-                username=username,
-                email=email,
-                password='testpassword123'
-            )
-            users.append(user)
+    def run_stage(self, stage, total, context, chunk_size=None):
+        """Разбиение диапазона [0, total) на куски и их вставка, параллельно при workers > 1"""
+        chunk_size = chunk_size or self.chunk_size
+        jobs = [
+            (stage, chunk_no, start, min(start + chunk_size, total), self.seed, context)
+            for chunk_no, start in enumerate(range(0, total, chunk_size))
+        ]
 
-        created_users = User.objects.bulk_create(users, batch_size=1000)
+        if self.workers > 1 and len(jobs) > 1:
+            connections.close_all()
+            with ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork')) as pool:
+                inserted = sum(pool.map(run_job, jobs))
+        else:
+            inserted = sum(map(run_job, jobs))
 
-        for user in created_users:
-            profile = UserProfile(
-                user=user,
-                avatar=None
-            )
-            user_profiles.append(profile)
+        self.stdout.write(f'{stage}: {inserted}')
+        return inserted
 
-        UserProfile.objects.bulk_create(user_profiles, batch_size=1000)
-        return len(created_users)
+    def create_users(self, count):
+        """Создание пользователей и их профилей"""
+        before = max_id(User)
+        created = self.run_stage('users', count, {'offset': User.objects.count()})
+        users = IdPool.for_new_rows(User, before, created)
+
+        self.run_stage('profiles', len(users), {'users': users})
+        return created, users
 
     def create_tags(self, count):
         """Создание тегов"""
-        existing_count = Tag.objects.count()
-        tags = []
-        for i in range(count):
-            name = f'tag_{existing_count + i + 1}'
-            tags.append(Tag(name=name))
-
-        created_tags = Tag.objects.bulk_create(tags, batch_size=1000)
-        return len(created_tags)
-
-    def create_questions(self, count):
-        """Создание вопросов"""
-        users = list(User.objects.all())
-        tags = list(Tag.objects.all())
+        before = max_id(Tag)
+        created = self.run_stage('tags', count, {'offset': Tag.objects.count()})
+        return created, IdPool.for_new_rows(Tag, before, created)
 
-        if not users:
+    def create_questions(self, count, users, tags, now):
+        """Создание вопросов и привязка к ним тегов"""
+        if not len(users):
             self.stdout.write(self.style.WARNING('No users found. Please create users first.'))
-            return 0
-
-        existing_count = Question.objects.count()
-        questions = []
-
-        for i in range(count):
-            questions.append(Question(
-                title=f'Question #{existing_count + i + 1}',
-                content=FAKE_QUESTION_CONTENT,
-                author=random.choice(users),
-                is_active=True
-            ))
+            return 0, IdPool()
 
-        created_questions = Question.objects.bulk_create(questions, batch_size=1000)
+        before = max_id(Question)
+        context = {'users': users, 'offset': Question.all_objects.count(), 'now': now}
+        created = self.run_stage('questions', count, context)
+        questions = IdPool.for_new_rows(Question, before, created)
 
-        for question in created_questions:
-            question_tags = random.sample(tags, min(random.randint(1, 5), len(tags)))
-            question.tags.set(question_tags)
+        if len(tags):
+            self.run_stage('question_tags', len(questions), {'questions': questions, 'tags': tags})
 
-        return len(created_questions)
+        return created, questions
 
-    def create_answers(self, count):
+    def create_answers(self, count, users, questions, now):
         """Создание ответов"""
-        users = list(User.objects.all())
-        questions = list(Question.objects.all())
-
-        if not users or not questions:
+        if not len(users) or not len(questions):
             self.stdout.write(self.style.WARNING('No users or questions found.'))
-            return 0
-
-        answers = []
-        for i in range(count):
-            answers.append(Answer(
-                content=FAKE_ANSWER_CONTENT,
-                author=random.choice(users),
-                question=random.choice(questions)
-            ))
-
-        created_answers = Answer.objects.bulk_create(answers, batch_size=1000)
-        return len(created_answers)
-
-    def create_question_likes(self, count):
-        """Создание лайков вопросов"""
-        users = list(User.objects.all())
-        questions = list(Question.objects.all())
-
-        if not users or not questions:
-            self.stdout.write(self.style.WARNING('No users or questions found for likes.'))
-            return 0
+            return 0, IdPool()
 
-        likes_to_create = []
-        used_pairs = set()
+        before = max_id(Answer)
+        created = self.run_stage('answers', count, {'users': users, 'questions': questions, 'now': now})
+        return created, IdPool.for_new_rows(Answer, before, created)
 
-        for i in range(count):
-            user = random.choice(users)
-            question = random.choice(questions)
-            pair = (user.id, question.id)
-
-            if pair not in used_pairs:
-                likes_to_create.append(QuestionLike(
-                    user=user,
-                    question=question
-                ))
-                used_pairs.add(pair)
-
-        created_likes = QuestionLike.objects.bulk_create(likes_to_create, batch_size=2000)
-        return len(created_likes)
-
-    def create_answer_likes(self, count):
-        """Создание лайков ответов"""
-        users = list(User.objects.all())
-        answers = list(Answer.objects.all())
-
-        if not users or not answers:
-            self.stdout.write(self.style.WARNING('No users or answers found for likes.'))
+    def create_likes(self, stage, count, users, objects):
+        """Создание лайков вопросов или ответов"""
+        if not len(users) or not len(objects):
+            self.stdout.write(self.style.WARNING(f'No users or objects found for {stage}.'))
             return 0
 
-        likes_to_create = []
-        used_pairs = set()
-
-        for i in range(count):
-            user = random.choice(users)
-            answer = random.choice(answers)
-            pair = (user.id, answer.id)
-
-            if pair not in used_pairs:
-                likes_to_create.append(AnswerLike(
-                    user=user,
-                    answer=answer
-                ))
-                used_pairs.add(pair)
-
-        created_likes = AnswerLike.objects.bulk_create(likes_to_create, batch_size=2000)
-        return len(created_likes)
\ No newline at end of file
+        per_object = max(1, count // len(objects))
+        context = {'users': users, 'objects': objects, 'count': count}
+        return self.run_stage(stage, len(objects), context, chunk_size=max(1, self.chunk_size // per_object))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.votes import flush_votes
+
+
+class Command(BaseCommand):
+    help = 'Write buffered votes (VOTE_BUFFER_ENABLED) to the database; --interval keeps flushing in a loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Log entries read per batch')
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Seconds between flushes; without it the command flushes once and exits')
+
+    def handle(self, *args, **options):
+        while True:
+            written = flush_votes(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Votes flushed: {written}'))
+
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
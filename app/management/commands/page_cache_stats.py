@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from app.pagecache import reset_stats, stats
+
+
+class Command(BaseCommand):
+    help = 'Show anonymous page cache hit/miss counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them')
+
+    def handle(self, *args, **options):
+        current = stats()
+        ratio = 'n/a' if current['hit_ratio'] is None else f'{current["hit_ratio"]:.1%}'
+        self.stdout.write(f'Page cache hits: {current["hits"]}, misses: {current["misses"]}, hit ratio: {ratio}')
+
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
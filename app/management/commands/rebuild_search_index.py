@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from app.search import rebuild_index, uses_postgres
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the inverted search index (no-op on PostgreSQL, which maintains tsvector itself)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Questions indexed per transaction')
+
+    def handle(self, *args, **options):
+        if uses_postgres():
+            self.stdout.write('PostgreSQL full-text search is maintained by the database, nothing to rebuild')
+            return
+
+        postings = rebuild_index(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt: {postings} postings'))
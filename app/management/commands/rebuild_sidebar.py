@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from app.sidebar import rebuild_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Rebuild cached sidebar snapshot (popular tags and best members)'
+
+    def handle(self, *args, **options):
+        snapshot = rebuild_snapshot()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Sidebar rebuilt: {len(snapshot["tags"])} tags, {len(snapshot["members"])} members'
+            )
+        )
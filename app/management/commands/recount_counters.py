@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from app.managers import count_subquery
+from app.models import Question, Answer, QuestionLike, AnswerLike, Tag, QuestionTag
+
+
+class Command(BaseCommand):
+    help = 'Backfill and reconcile denormalized like/answer/tag counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Rows updated per statement')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        questions = self.recount(
+            Question.all_objects,
+            chunk_size,
+            likes_count=count_subquery(QuestionLike, 'question'),
+            answers_count=count_subquery(Answer, 'question'),
+            rating=count_subquery(QuestionLike, 'question') + count_subquery(Answer, 'question'),
+        )
+        answers = self.recount(
+            Answer.all_objects,
+            chunk_size,
+            likes_count=count_subquery(AnswerLike, 'answer'),
+            rating=count_subquery(AnswerLike, 'answer'),
+        )
+
+        tags = self.recount(
+            Tag.objects,
+            chunk_size,
+            questions_count=count_subquery(QuestionTag, 'tag'),
+        )
+
+        self.stdout.write(self.style.SUCCESS(f'Recounted questions: {questions}, answers: {answers}, tags: {tags}'))
+
+    def recount(self, manager, chunk_size, **counters):
+        """Пересчёт счётчиков диапазонами id, чтобы не держать долгих блокировок"""
+        max_id = manager.aggregate(max_id=Max('id'))['max_id'] or 0
+        updated = 0
+
+        for start in range(0, max_id + 1, chunk_size):
+            updated += manager.filter(id__gte=start, id__lt=start + chunk_size).update(**counters)
+
+        return updated
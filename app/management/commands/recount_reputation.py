@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from app.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-user question/answer/like counters and reputation in id chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Profiles updated per statement')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        max_id = UserProfile.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        updated = 0
+
+        # Диапазонами id, чтобы не держать долгих блокировок на профилях
+        for start in range(0, max_id + 1, chunk_size):
+            updated += UserProfile.objects.recount(
+                UserProfile.objects.filter(id__gte=start, id__lt=start + chunk_size)
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Recounted reputation for {updated} profiles'))
@@ -1,6 +1,30 @@
-from django.db import models
+from django.apps import apps
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models import Count, Q
+from django.db.models import Count, Q, F, OuterRef, Subquery, IntegerField, Value
+from django.db.models.functions import Coalesce
+
+from app import signals
+from app.hot import hot_increment
+
+
+# Вес вопроса, ответа и полученного лайка в репутации пользователя
+QUESTION_POINTS = 1
+ANSWER_POINTS = 2
+LIKE_POINTS = 5
+
+
+def count_subquery(model, field, outer='pk'):
+    """Подзапрос количества строк model, ссылающихся на текущий объект (его поле outer) через field"""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef(outer)}).order_by().values(field).annotate(
+                total=Count('pk')
+            ).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
 
 
 class DefaultManager(models.Manager):
@@ -8,43 +32,121 @@ class DefaultManager(models.Manager):
         return self.filter(is_active=True)
 
 
+class UserProfileManager(models.Manager):
+    def best_members(self, limit):
+        """Первые limit пользователей по репутации - limit записей индекса profile_reputation_idx"""
+        return self.select_related('user').order_by('-reputation', '-id')[:limit]
+
+    def add_activity(self, user_id, questions=0, answers=0, likes=0):
+        """Атомарное изменение счётчиков пользователя и его репутации"""
+        if user_id is None:
+            return 0
+        return self.filter(user_id=user_id).update(
+            questions_count=F('questions_count') + questions,
+            answers_count=F('answers_count') + answers,
+            likes_received=F('likes_received') + likes,
+            reputation=F('reputation') + questions * QUESTION_POINTS + answers * ANSWER_POINTS + likes * LIKE_POINTS,
+        )
+
+    def set_avatar(self, user_id, digest):
+        """Новая аватарка пользователя вместе с её копией в author_avatar его вопросов и ответов"""
+        Question, Answer = apps.get_model('app', 'Question'), apps.get_model('app', 'Answer')
+        with transaction.atomic():
+            self.filter(user_id=user_id).update(avatar_hash=digest)
+            Question.objects.filter(author_id=user_id).update(author_avatar=digest)
+            Answer.objects.filter(author_id=user_id).update(author_avatar=digest)
+
+    def avatar_of(self, user_id):
+        """Подзапрос хэша аватарки пользователя для author_avatar нового вопроса или ответа"""
+        return Coalesce(Subquery(self.filter(user_id=user_id).values('avatar_hash')[:1]), Value(''))
+
+    def recount(self, queryset=None):
+        """Точные счётчики и репутация профилей queryset (по умолчанию всех)"""
+        Question, Answer = apps.get_model('app', 'Question'), apps.get_model('app', 'Answer')
+        QuestionLike, AnswerLike = apps.get_model('app', 'QuestionLike'), apps.get_model('app', 'AnswerLike')
+
+        queryset = self.all() if queryset is None else queryset
+        queryset.update(
+            questions_count=count_subquery(Question, 'author', 'user_id'),
+            answers_count=count_subquery(Answer, 'author', 'user_id'),
+            likes_received=(
+                count_subquery(QuestionLike, 'question__author', 'user_id')
+                + count_subquery(AnswerLike, 'answer__author', 'user_id')
+            ),
+        )
+        return queryset.update(
+            reputation=(
+                F('questions_count') * QUESTION_POINTS
+                + F('answers_count') * ANSWER_POINTS
+                + F('likes_received') * LIKE_POINTS
+            ),
+        )
+
+
 class QuestionManager(DefaultManager):
     def best_questions(self):
-        return self.active().select_related('author').prefetch_related('tags').annotate(
-            likes_count=Count('questionlike', distinct=True),
-            answers_count=Count('answers', distinct=True),
-            total_rating=models.F('likes_count') + models.F('answers_count')
-        ).order_by('-total_rating', '-created_at')
+        return self.active().select_related('author').prefetch_related('tags').order_by('-rating', '-id')
 
     def new_questions(self):
-        return self.active().select_related('author').prefetch_related('tags').order_by('-created_at')
+        return self.active().select_related('author').prefetch_related('tags').order_by('-created_at', '-id')
 
     def with_tags(self, tag_names):
-        return self.active().select_related('author').prefetch_related('tags').filter(tags__name__in=tag_names).distinct()
+        question_tags = self.model.tags.through.objects.filter(tag__name__in=tag_names).values('question_id')
+        return self.new_questions().filter(id__in=question_tags)
+
+    def with_all_tags(self, tags):
+        """
+        Вопросы, у которых есть все теги.
+
+        Каждый тег - отдельный join по уникальной паре (question, tag), поэтому дублей нет и DISTINCT не нужен;
+        первым идёт самый редкий тег.
+        """
+        questions = self.new_questions()
+        for tag in sorted(tags, key=lambda tag: tag.questions_count):
+            questions = questions.filter(questiontag__tag=tag)
+        return questions
 
     def hot_questions(self):
-        return self.active().select_related('author').prefetch_related('tags').annotate(
-            answers_count=Count('answers', distinct=True)
-        ).order_by('-answers_count', '-created_at')
+        return self.active().select_related('author').prefetch_related('tags').order_by('-hot_score', '-id')
 
     def unanswered_questions(self):
-        return self.active().select_related('author').prefetch_related('tags').annotate(
-            answers_count=Count('answers')
-        ).filter(answers_count=0).order_by('-created_at')
+        return self.active().select_related('author').prefetch_related('tags').filter(
+            answers_count=0
+        ).order_by('-created_at')
 
     def with_user_activity(self):
         return self.active().select_related('author').prefetch_related('tags').annotate(
-            likes_count=Count('questionlike'),
-            answers_count=Count('answers'),
             author_name=models.F('author__username')
         )
 
+    def add_likes(self, question, delta):
+        """Атомарное изменение счётчика лайков, рейтинга и горячести вопроса"""
+        return self.filter(pk=question.pk).update(
+            likes_count=F('likes_count') + delta,
+            rating=F('rating') + delta,
+            hot_score=hot_increment(delta, question.created_at)
+        )
+
+    def add_answers(self, question, delta):
+        """Атомарное изменение счётчика ответов, рейтинга и горячести вопроса"""
+        return self.filter(pk=question.pk).update(
+            answers_count=F('answers_count') + delta,
+            rating=F('rating') + delta,
+            hot_score=hot_increment(delta, question.created_at)
+        )
+
+
+class QuestionTagManager(models.Manager):
+    def feed(self, tag):
+        """Лента тега по индексу (tag, question_created_at, id) без сортировки всех вопросов тега"""
+        return self.filter(tag=tag, question__is_active=True).select_related(
+            'question__author'
+        ).prefetch_related('question__tags').order_by('-question_created_at', '-id')
+
 
 class AnswerQuerySet(models.QuerySet):
     def best_answers(self):
-        return self.select_related('author').annotate(
-            likes_count=Count('answerlike')
-        ).order_by('-likes_count', '-created_at')
+        return self.select_related('author').order_by('-likes_count', '-id')
 
 class AnswerManager(DefaultManager):
     def get_queryset(self):
@@ -55,3 +157,34 @@ class AnswerManager(DefaultManager):
 
     def for_question(self, question_id):
         return self.select_related('author').filter(question_id=question_id).order_by('-created_at')
+
+    def ranked_above(self, answer):
+        """Ответы того же вопроса выше answer в порядке best_answers - диапазон индекса answer_best_idx"""
+        return self.filter(question_id=answer.question_id).filter(
+            Q(likes_count__gt=answer.likes_count) | Q(likes_count=answer.likes_count, id__gt=answer.pk)
+        )
+
+    def best_rank(self, answer):
+        """Место answer среди best_answers его вопроса, считая с нуля; сами ответы не выбираются"""
+        return self.ranked_above(answer).count()
+
+    def create_for_question(self, question, author, content):
+        """Создание ответа вместе с обновлением счётчиков вопроса"""
+        with transaction.atomic():
+            profiles = apps.get_model('app', 'UserProfile').objects
+            answer = self.create(
+                question=question, author=author, content=content, author_avatar=profiles.avatar_of(author.pk)
+            )
+            type(question).objects.add_answers(question, 1)
+            profiles.add_activity(author.pk, answers=1)
+
+        signals.question_updated.send(sender=type(question), question_id=question.pk)
+        return answer
+
+    def add_likes(self, answer_id, delta):
+        """Атомарное изменение счётчика лайков и рейтинга ответа"""
+        return self.filter(pk=answer_id).update(
+            likes_count=F('likes_count') + delta,
+            rating=F('rating') + delta
+        )
+
@@ -0,0 +1,114 @@
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+_current = ContextVar('request_metrics', default=None)
+
+STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Форма запроса без литералов: одинаковые отпечатки у запросов, отличающихся только параметрами"""
+    sql = STRING_LITERAL_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    return WHITESPACE_RE.sub(' ', sql).strip()
+
+
+class RequestMetrics:
+    """Метрики одного запроса: число и время SQL-запросов, ожидание соединений, время рендеринга шаблонов"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.connects = 0
+        self.connect_time = 0.0
+        self.fingerprints = Counter()
+        self._lock = threading.Lock()
+
+    def record_query(self, sql, duration):
+        with self._lock:
+            self.queries += 1
+            self.db_time += duration
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def record_connect(self, duration):
+        with self._lock:
+            self.connects += 1
+            self.connect_time += duration
+
+    def record_template(self, duration):
+        with self._lock:
+            self.template_time += duration
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+    def duplicates(self):
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries, {len(self.duplicates())} duplicated"',
+            f'conn;dur={self.connect_time * 1000:.1f};desc="{self.connects} connects"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ])
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'connects': self.connects,
+            'connect_ms': round(self.connect_time * 1000, 2),
+            'template_ms': round(self.template_time * 1000, 2),
+            'total_ms': round(self.total_time * 1000, 2),
+            'duplicates': [{'sql': sql, 'count': count} for sql, count in self.duplicates().items()],
+        }
+
+
+def current():
+    return _current.get()
+
+
+def activate(metrics):
+    return _current.set(metrics)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper, записывающий запрос в метрики текущего запроса (если они включены)"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(sql, time.perf_counter() - start)
+
+
+def record_connect(duration):
+    """Время открытия соединения или ожидания его в пуле, если метрики включены"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.record_connect(duration)
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    """Подключение record_query к каждому новому соединению, в любом потоке и для любой БД"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
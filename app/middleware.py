@@ -0,0 +1,319 @@
+import json
+import logging
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseNotModified
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from app import avatars, conditional, metrics, pagecache, routers, staticfiles
+from app.fragments import CSRF_SENTINEL
+
+logger = logging.getLogger('app.metrics')
+
+
+class StaticFilesMiddleware:
+    """
+    Раздача собранной статики (STATIC_ROOT) из процесса приложения без отдельного веб-сервера.
+
+    Отдаёт заранее сжатые .br/.gz варианты по Accept-Encoding, файлы с хэшем в имени -
+    с Cache-Control immutable на год. Поддерживает If-None-Match и один диапазон Range.
+    Так же отдаются миниатюры аватарок: их имена - хэш содержимого, и они тоже immutable.
+    В DEBUG статику раздаёт runserver, а при STATIC_SERVE=False - внешний сервер.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if settings.DEBUG or not settings.STATIC_SERVE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        if not self.handles(request):
+            return await self.get_response(request)
+        # Чтение файла с диска не должно останавливать цикл событий воркера
+        response = await sync_to_async(self.serve, thread_sensitive=False)(request)
+        return response or await self.get_response(request)
+
+    def handles(self, request):
+        """Запрос к статике или аватаркам, который может отдать serve"""
+        return request.method in ('GET', 'HEAD') and request.path.startswith(
+            (settings.STATIC_URL, f'{settings.MEDIA_URL}{avatars.AVATAR_DIR}/')
+        )
+
+    def serve(self, request):
+        if not self.handles(request):
+            return None
+        avatars_url = f'{settings.MEDIA_URL}{avatars.AVATAR_DIR}/'
+        if request.path.startswith(settings.STATIC_URL):
+            static_file = staticfiles.find(request.path[len(settings.STATIC_URL):])
+        elif request.path.startswith(avatars_url):
+            # Аватарок много, поэтому в памяти процесса они не кэшируются
+            static_file = staticfiles.load(
+                os.path.join(settings.MEDIA_ROOT, avatars.AVATAR_DIR), request.path[len(avatars_url):], immutable=True
+            )
+        else:
+            return None
+        if static_file is None:
+            return None
+
+        ranged = 'range' in request.headers
+        encoding = 'identity' if ranged else self.pick_encoding(request, static_file)
+        content, etag = static_file.variants[encoding]
+
+        if etag in (tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')):
+            response = HttpResponseNotModified()
+        else:
+            response = self.ranged(request, content) if ranged else HttpResponse(content)
+            response['Content-Type'] = static_file.content_type
+            response['Accept-Ranges'] = 'bytes'
+            response['Last-Modified'] = static_file.last_modified
+            if encoding != 'identity':
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Cache-Control'] = static_file.cache_control
+        response['Vary'] = 'Accept-Encoding'
+
+        if request.method == 'HEAD' and response.status_code != 304:
+            response['Content-Length'] = len(response.content)
+            response.content = b''
+        return response
+
+    def pick_encoding(self, request, static_file):
+        accepted = set()
+        for item in request.headers.get('Accept-Encoding', '').split(','):
+            coding, _, params = item.strip().partition(';')
+            if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                accepted.add(coding.strip())
+        for encoding, _ in staticfiles.ENCODINGS:
+            if encoding in static_file.variants and (encoding in accepted or '*' in accepted):
+                return encoding
+        return 'identity'
+
+    def ranged(self, request, content):
+        """Ответ 206 на один диапазон bytes=start-end, 416 на недопустимый, весь файл на остальные"""
+        unit, _, spec = request.headers['Range'].partition('=')
+        start, sep, end = spec.strip().partition('-')
+        if unit.strip() != 'bytes' or not sep or ',' in spec or not (start + end).isdigit():
+            return HttpResponse(content)
+
+        size = len(content)
+        if start:
+            first, last = int(start), min(int(end) if end else size - 1, size - 1)
+        else:
+            first, last = max(size - int(end), 0), size - 1
+        if first > last or first >= size:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        response = HttpResponse(content[first:last + 1], status=206)
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+        return response
+
+
+class RequestMetricsMiddleware:
+    """
+    Число и время SQL-запросов, время рендеринга и повторяющиеся запросы для каждого запроса.
+
+    Результат отдаётся в заголовке Server-Timing, пишется в лог app.metrics
+    и доступен тестам как response.request_metrics.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.activate(request_metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.deactivate(token)
+        return self.finish(request, response, request_metrics)
+
+    async def __acall__(self, request):
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.activate(request_metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.deactivate(token)
+        return self.finish(request, response, request_metrics)
+
+    def process_template_response(self, request, response):
+        request_metrics = metrics.current()
+        if request_metrics is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: request_metrics.record_template(time.perf_counter() - started)
+            )
+        return response
+
+    def finish(self, request, response, request_metrics):
+        response['Server-Timing'] = request_metrics.server_timing()
+        response.request_metrics = request_metrics
+
+        match = getattr(request, 'resolver_match', None)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            **request_metrics.as_dict(),
+        }))
+        return response
+
+
+class ReplicaPinningMiddleware:
+    """
+    Состояние маршрутизации запросов между мастером и репликами (app.routers).
+
+    Запрос, который что-то записал, ставит cookie на REPLICA_PIN_SECONDS: пока она жива,
+    все чтения этой сессии идут на мастер и пользователь сразу видит свой голос или ответ.
+    """
+    sync_capable = True
+    async_capable = True
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        if not settings.REPLICA_DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        state = self.state_for(request)
+        token = routers.activate(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.deactivate(token)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        state = self.state_for(request)
+        token = routers.activate(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routers.deactivate(token)
+        return self.finish(response, state)
+
+    def state_for(self, request):
+        pinned_until = request.COOKIES.get(settings.REPLICA_PIN_COOKIE_NAME, '')
+        pinned = request.method not in self.safe_methods or (
+            pinned_until.isdigit() and int(pinned_until) > time.time()
+        )
+        return routers.RoutingState(pinned)
+
+    def finish(self, response, state):
+        if state.wrote:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE_NAME,
+                str(int(time.time() + settings.REPLICA_PIN_SECONDS)),
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class PageCacheMiddleware:
+    """
+    Кэш целых страниц для анонимных посетителей (app.pagecache).
+
+    Ключ зависит от URL, параметров page/cursor и версий групп страницы; версии
+    меняются по сигналам app.signals. CSRF-токен хранится в кэше меткой и подставляется
+    для каждого ответа. Заголовок X-Page-Cache показывает HIT или MISS.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PAGE_CACHE_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.finish(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return await sync_to_async(self.finish)(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        key = pagecache.page_key(request, match.view_name, view_kwargs)
+        if key is None:
+            return None
+
+        if conditional.is_conditional(request):
+            # View ответит 304 без тела, если версия у клиента совпадает, иначе страница закэшируется
+            request.page_cache_key = key
+            return None
+
+        cached = pagecache.get_page(key)
+        pagecache.count(hit=cached is not None)
+        if cached is None:
+            request.page_cache_key = key
+            return None
+
+        content, content_type, headers = cached
+        response = HttpResponse(content, content_type=content_type, headers=headers)
+        response.page_cache_hit = True
+        return response
+
+    def process_template_response(self, request, response):
+        if getattr(request, 'page_cache_key', None):
+            response.context_data['csrf_token'] = CSRF_SENTINEL
+        return response
+
+    def finish(self, request, response):
+        hit = getattr(response, 'page_cache_hit', False)
+        key = getattr(request, 'page_cache_key', None)
+        if not hit and key is None:
+            return response
+
+        if key is not None and response.status_code == 200 and not response.streaming:
+            headers = {name: response[name] for name in conditional.HEADERS if name in response}
+            pagecache.set_page(key, response.content, response['Content-Type'], headers)
+
+        response.content = pagecache.personalise(response.content, get_token(request))
+        response['X-Page-Cache'] = 'HIT' if hit else 'MISS'
+        patch_vary_headers(response, ['Cookie'])
+        patch_cache_control(response, private=True, max_age=settings.PAGE_CACHE_BROWSER_TTL)
+        return response
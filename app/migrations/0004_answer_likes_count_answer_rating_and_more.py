@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-17 07:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_alter_answer_question'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='likes_count',
+            field=models.IntegerField(default=0, verbose_name='Количество лайков'),
+        ),
+        migrations.AddField(
+            model_name='answer',
+            name='rating',
+            field=models.IntegerField(default=0, help_text='Лайки', verbose_name='Рейтинг'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='answers_count',
+            field=models.IntegerField(default=0, verbose_name='Количество ответов'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='likes_count',
+            field=models.IntegerField(default=0, verbose_name='Количество лайков'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='rating',
+            field=models.IntegerField(default=0, help_text='Лайки + ответы', verbose_name='Рейтинг'),
+        ),
+    ]
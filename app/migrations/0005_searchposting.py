@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-17 07:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Колонка tsvector и GIN-индекс нужны только PostgreSQL, остальные СУБД используют таблицу SearchPosting
+SEARCH_VECTOR_SQL = """
+ALTER TABLE app_question ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(content, '')), 'B')
+) STORED;
+CREATE INDEX app_question_search_vector_gin ON app_question USING gin (search_vector);
+"""
+
+DROP_SEARCH_VECTOR_SQL = """
+DROP INDEX IF EXISTS app_question_search_vector_gin;
+ALTER TABLE app_question DROP COLUMN IF EXISTS search_vector;
+"""
+
+
+def add_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(SEARCH_VECTOR_SQL)
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_VECTOR_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_answer_likes_count_answer_rating_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Термин')),
+                ('weight', models.PositiveSmallIntegerField(default=1, verbose_name='Вес')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.question', verbose_name='Вопрос')),
+            ],
+            options={
+                'verbose_name': 'Запись поискового индекса',
+                'verbose_name_plural': 'Поисковый индекс',
+                'unique_together': {('term', 'question')},
+            },
+        ),
+        migrations.RunPython(add_search_vector, drop_search_vector),
+    ]
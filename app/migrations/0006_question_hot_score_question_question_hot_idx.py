@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-17 07:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_searchposting'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='hot_score',
+            field=models.FloatField(default=0, help_text='Рейтинг с затуханием по времени', verbose_name='Горячесть'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-hot_score', '-id'], name='question_hot_idx'),
+        ),
+    ]
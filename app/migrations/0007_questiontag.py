@@ -0,0 +1,76 @@
+# Перевод Question.tags на явную промежуточную модель поверх существующей таблицы app_question_tags
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def backfill(apps, schema_editor):
+    Question = apps.get_model('app', 'Question')
+    QuestionTag = apps.get_model('app', 'QuestionTag')
+    Tag = apps.get_model('app', 'Tag')
+
+    QuestionTag.objects.update(
+        question_created_at=Subquery(Question.objects.filter(pk=OuterRef('question_id')).values('created_at')[:1])
+    )
+    Tag.objects.update(
+        questions_count=Subquery(
+            QuestionTag.objects.filter(tag=OuterRef('pk')).order_by().values('tag').annotate(
+                total=Count('pk')
+            ).values('total')
+        )
+    )
+    Tag.objects.filter(questions_count__isnull=True).update(questions_count=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_question_hot_score_question_question_hot_idx'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='QuestionTag',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.question', verbose_name='Вопрос')),
+                        ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.tag', verbose_name='Тег')),
+                    ],
+                    options={
+                        'verbose_name': 'Тег вопроса',
+                        'verbose_name_plural': 'Теги вопросов',
+                        'db_table': 'app_question_tags',
+                        'unique_together': {('question', 'tag')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='question',
+                    name='tags',
+                    field=models.ManyToManyField(blank=True, through='app.QuestionTag', to='app.tag', verbose_name='Теги вопроса'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='questiontag',
+            name='question_created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Копия Question.created_at для ленты тега', verbose_name='Время создания вопроса'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='questions_count',
+            field=models.IntegerField(default=0, verbose_name='Количество вопросов'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='questiontag',
+            index=models.Index(fields=['tag', '-question_created_at', '-id'], name='questiontag_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['-questions_count'], name='tag_popular_idx'),
+        ),
+    ]
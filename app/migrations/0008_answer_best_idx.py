@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-17 07:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_questiontag'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['question', '-likes_count', '-id'], name='answer_best_idx'),
+        ),
+    ]
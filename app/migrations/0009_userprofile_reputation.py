@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-17 07:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_answer_best_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='answers_count',
+            field=models.IntegerField(default=0, verbose_name='Количество ответов'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='likes_received',
+            field=models.IntegerField(default=0, verbose_name='Полученные лайки'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='questions_count',
+            field=models.IntegerField(default=0, verbose_name='Количество вопросов'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='reputation',
+            field=models.IntegerField(default=0, help_text='Вопросы, ответы и полученные лайки с весами', verbose_name='Репутация'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['-reputation', '-id'], name='profile_reputation_idx'),
+        ),
+    ]
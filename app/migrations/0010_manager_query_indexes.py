@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-17 07:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_userprofile_reputation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['question', '-created_at'], name='answer_question_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='answerlike',
+            index=models.Index(fields=['answer', 'user'], name='answerlike_answer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at', '-id'], name='question_new_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-rating', '-id'], name='question_best_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('answers_count', 0), ('is_active', True)), fields=['-created_at'], name='question_unanswered_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionlike',
+            index=models.Index(fields=['question', 'user'], name='questionlike_question_idx'),
+        ),
+        # Старые индексы внешних ключей удаляются после создания составных
+        migrations.AlterField(
+            model_name='answerlike',
+            name='answer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='app.answer', verbose_name='Ответ'),
+        ),
+        migrations.AlterField(
+            model_name='questionlike',
+            name='question',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='app.question', verbose_name='Вопрос'),
+        ),
+    ]
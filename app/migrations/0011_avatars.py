@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-17 08:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_manager_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='author_avatar',
+            field=models.CharField(blank=True, default='', help_text='Копия UserProfile.avatar_hash для карточки', max_length=32, verbose_name='Аватарка автора'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='author_avatar',
+            field=models.CharField(blank=True, default='', help_text='Копия UserProfile.avatar_hash для карточки', max_length=32, verbose_name='Аватарка автора'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='avatar_hash',
+            field=models.CharField(blank=True, default='', help_text='Имя миниатюр в app.avatars, пусто - аватарки нет', max_length=32, verbose_name='Хэш аватарки'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, upload_to='avatars/', verbose_name='Аватарка пользователя'),
+        ),
+    ]
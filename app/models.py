@@ -1,18 +1,30 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
-from app.managers import DefaultManager, QuestionManager, AnswerManager
+from app.managers import DefaultManager, UserProfileManager, QuestionManager, AnswerManager, QuestionTagManager
 
 
 class UserProfile(models.Model):
     user = models.ForeignKey(User, verbose_name="Пользователь", on_delete=models.CASCADE)
-    avatar = models.ImageField(verbose_name="Аватарка пользователя", upload_to='uploads/', null=True, blank=True)
+    avatar = models.ImageField(verbose_name="Аватарка пользователя", upload_to='avatars/', null=True, blank=True)
+    avatar_hash = models.CharField(verbose_name="Хэш аватарки", help_text="Имя миниатюр в app.avatars, пусто - аватарки нет", max_length=32, blank=True, default='')
     created_at = models.DateTimeField(verbose_name="Время создания профиля", auto_now_add=True)
     updated_at = models.DateTimeField(verbose_name="Время редактирования профиля", auto_now=True)
 
+    questions_count = models.IntegerField(verbose_name="Количество вопросов", default=0)
+    answers_count = models.IntegerField(verbose_name="Количество ответов", default=0)
+    likes_received = models.IntegerField(verbose_name="Полученные лайки", default=0)
+    reputation = models.IntegerField(verbose_name="Репутация", help_text="Вопросы, ответы и полученные лайки с весами", default=0)
+
+    objects = UserProfileManager()
+
     class Meta:
         verbose_name = "Профиль пользователя"
         verbose_name_plural = "Профили пользователей"
+        indexes = [
+            models.Index(fields=['-reputation', '-id'], name='profile_reputation_idx'),
+        ]
 
     def __str__(self):
         return self.user.username
@@ -20,10 +32,14 @@ class UserProfile(models.Model):
 
 class Tag(models.Model):
     name = models.CharField(verbose_name="Имя тега", max_length=50, unique=True)
+    questions_count = models.IntegerField(verbose_name="Количество вопросов", default=0)
 
     class Meta:
         verbose_name = "Тег"
         verbose_name_plural = "Теги"
+        indexes = [
+            models.Index(fields=['-questions_count'], name='tag_popular_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -33,10 +49,16 @@ class Question(models.Model):
     title = models.CharField(verbose_name="Вопрос", max_length=255)
     content = models.TextField(verbose_name="Описание вопроса", max_length=4000)
     author = models.ForeignKey(User, verbose_name="Автор вопроса", on_delete=models.SET_NULL, null=True, related_name="questions")
-    tags = models.ManyToManyField(Tag, verbose_name="Теги вопроса", blank=True)
+    tags = models.ManyToManyField(Tag, verbose_name="Теги вопроса", blank=True, through="app.QuestionTag")
     created_at = models.DateTimeField(verbose_name="Время создания вопроса", auto_now_add=True)
     updated_at = models.DateTimeField(verbose_name="Время редактирования вопроса", auto_now=True)
 
+    likes_count = models.IntegerField(verbose_name="Количество лайков", default=0)
+    answers_count = models.IntegerField(verbose_name="Количество ответов", default=0)
+    rating = models.IntegerField(verbose_name="Рейтинг", help_text="Лайки + ответы", default=0)
+    hot_score = models.FloatField(verbose_name="Горячесть", help_text="Рейтинг с затуханием по времени", default=0)
+    author_avatar = models.CharField(verbose_name="Аватарка автора", help_text="Копия UserProfile.avatar_hash для карточки", max_length=32, blank=True, default='')
+
     is_active = models.BooleanField(verbose_name="Активно?", help_text="Если TRUE - отображается пользователям", default=True)
 
     objects = QuestionManager()
@@ -45,11 +67,45 @@ class Question(models.Model):
     class Meta:
         verbose_name = "Вопрос"
         verbose_name_plural = "Вопросы"
+        indexes = [
+            models.Index(fields=['-hot_score', '-id'], name='question_hot_idx', condition=models.Q(is_active=True)),
+            # new_questions, with_tags, with_all_tags
+            models.Index(fields=['-created_at', '-id'], name='question_new_idx', condition=models.Q(is_active=True)),
+            # best_questions
+            models.Index(fields=['-rating', '-id'], name='question_best_idx', condition=models.Q(is_active=True)),
+            # unanswered_questions
+            models.Index(
+                fields=['-created_at'], name='question_unanswered_idx',
+                condition=models.Q(is_active=True, answers_count=0),
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class QuestionTag(models.Model):
+    question = models.ForeignKey("app.Question", verbose_name="Вопрос", on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, verbose_name="Тег", on_delete=models.CASCADE)
+    question_created_at = models.DateTimeField(
+        verbose_name="Время создания вопроса", help_text="Копия Question.created_at для ленты тега", default=timezone.now
+    )
+
+    objects = QuestionTagManager()
+
+    class Meta:
+        db_table = "app_question_tags"
+        unique_together = ['question', 'tag']
+        verbose_name = "Тег вопроса"
+        verbose_name_plural = "Теги вопросов"
+        indexes = [
+            models.Index(fields=['tag', '-question_created_at', '-id'], name='questiontag_feed_idx'),
+        ]
+
+    def __str__(self):
+        return f"Тег #{self.tag_id} у вопроса #{self.question_id}"
+
+
 class Answer(models.Model):
     content = models.TextField(verbose_name="Контент", max_length=4000)
     author = models.ForeignKey(User, verbose_name="Автор ответа", on_delete=models.SET_NULL, null=True)
@@ -58,6 +114,10 @@ class Answer(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    likes_count = models.IntegerField(verbose_name="Количество лайков", default=0)
+    rating = models.IntegerField(verbose_name="Рейтинг", help_text="Лайки", default=0)
+    author_avatar = models.CharField(verbose_name="Аватарка автора", help_text="Копия UserProfile.avatar_hash для карточки", max_length=32, blank=True, default='')
+
     is_active = models.BooleanField(verbose_name="Активно?", help_text="Если TRUE - отображается пользователям", default=True)
 
     objects = AnswerManager()
@@ -66,17 +126,26 @@ class Answer(models.Model):
     class Meta:
         verbose_name = "Ответ"
         verbose_name_plural = "Ответы"
+        indexes = [
+            models.Index(fields=['question', '-likes_count', '-id'], name='answer_best_idx'),
+            # for_question
+            models.Index(fields=['question', '-created_at'], name='answer_question_new_idx'),
+        ]
 
     def __str__(self):
         return f"Ответ #{self.id} к вопросу #{self.question_id}"
 
 
 class QuestionLike(models.Model):
-    question = models.ForeignKey("app.Question", verbose_name="Вопрос", on_delete=models.CASCADE)
+    # Лайки вопроса ищет составной индекс (question, user), отдельный индекс внешнего ключа не нужен
+    question = models.ForeignKey("app.Question", verbose_name="Вопрос", on_delete=models.CASCADE, db_index=False)
     user = models.ForeignKey(User, verbose_name="Пользователь", on_delete=models.CASCADE)
 
     class Meta:
         unique_together = ['user', 'question']
+        indexes = [
+            models.Index(fields=['question', 'user'], name='questionlike_question_idx'),
+        ]
         verbose_name = "Оценка вопроса"
         verbose_name_plural = "Оценки вопроса"
 
@@ -85,13 +154,30 @@ class QuestionLike(models.Model):
 
 
 class AnswerLike(models.Model):
-    answer = models.ForeignKey("app.Answer", verbose_name="Ответ", on_delete=models.CASCADE)
+    answer = models.ForeignKey("app.Answer", verbose_name="Ответ", on_delete=models.CASCADE, db_index=False)
     user = models.ForeignKey(User, verbose_name="Пользователь", on_delete=models.CASCADE)
 
     class Meta:
         unique_together = ['user', 'answer']
+        indexes = [
+            models.Index(fields=['answer', 'user'], name='answerlike_answer_idx'),
+        ]
         verbose_name = "Оценка ответа"
         verbose_name_plural = "Оценки ответа"
 
     def __str__(self):
-        return f"Лайк пользователя #{self.user_id} к ответу #{self.answer_id}"
\ No newline at end of file
+        return f"Лайк пользователя #{self.user_id} к ответу #{self.answer_id}"
+
+
+class SearchPosting(models.Model):
+    term = models.CharField(verbose_name="Термин", max_length=64)
+    question = models.ForeignKey("app.Question", verbose_name="Вопрос", on_delete=models.CASCADE)
+    weight = models.PositiveSmallIntegerField(verbose_name="Вес", default=1)
+
+    class Meta:
+        unique_together = ['term', 'question']
+        verbose_name = "Запись поискового индекса"
+        verbose_name_plural = "Поисковый индекс"
+
+    def __str__(self):
+        return f"{self.term} -> вопрос #{self.question_id}"
@@ -0,0 +1,130 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+
+from app.fragments import CSRF_SENTINEL
+
+HITS_KEY = 'pagecache:hits'
+MISSES_KEY = 'pagecache:misses'
+
+# Параметры запроса, которые различают страницы; с любыми другими страница не кэшируется
+KEY_PARAMS = ('page', 'cursor')
+
+
+def index_groups(kwargs):
+    return ['feed:index']
+
+
+def hot_groups(kwargs):
+    return ['feed:hot']
+
+
+def tag_groups(kwargs):
+    """Группы тегов пересечения и тега с '+' в имени (c++): лишняя группа только читается"""
+    names = dict.fromkeys([kwargs['tag_name'], *kwargs['tag_name'].split('+')])
+    return [f'feed:tag:{name}' for name in names if name]
+
+
+def question_groups(kwargs):
+    return [f'question:{kwargs["question_id"]}']
+
+
+# Кэшируемые страницы и группы инвалидации, от которых зависит их содержимое
+PAGE_GROUPS = {
+    'app:index': index_groups,
+    'app:hot': hot_groups,
+    'app:tag': tag_groups,
+    'app:question': question_groups,
+}
+
+
+def digest(value):
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+def version_key(group):
+    return f'pagecache:version:{digest(group)}'
+
+
+def incr(key):
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def bump(*groups):
+    """Новая версия групп: закэшированные страницы этих групп больше не читаются"""
+    for group in groups:
+        incr(version_key(group))
+
+
+def is_anonymous(request):
+    """Без cookie сессии пользователь анонимный; саму сессию для проверки не загружаем"""
+    return (
+        settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and CookieStorage.cookie_name not in request.COOKIES
+    )
+
+
+def page_key(request, view_name, kwargs):
+    """Ключ страницы или None, если запрос не кэшируется"""
+    groups = PAGE_GROUPS.get(view_name)
+    if groups is None or request.method not in ('GET', 'HEAD') or not is_anonymous(request):
+        return None
+    if any(name not in KEY_PARAMS for name in request.GET):
+        return None
+
+    groups = groups(kwargs)
+    versions = cache.get_many([version_key(group) for group in groups])
+    params = '&'.join(f'{name}={request.GET[name]}' for name in KEY_PARAMS if name in request.GET)
+    version = ','.join(str(versions.get(version_key(group), 0)) for group in groups)
+    return f'pagecache:page:{digest(f"{request.path}?{params}#{version}")}'
+
+
+def get_page(key):
+    return cache.get(key)
+
+
+def set_page(key, content, content_type, headers=None):
+    cache.set(key, (content, content_type, headers or {}), settings.PAGE_CACHE_TTL)
+
+
+def personalise(content, token):
+    """CSRF-токен в закэшированной разметке у каждого посетителя свой"""
+    return content.replace(CSRF_SENTINEL.encode(), token.encode())
+
+
+def count(hit):
+    incr(HITS_KEY if hit else MISSES_KEY)
+
+
+def stats():
+    values = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = values.get(HITS_KEY, 0), values.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+def on_question_created(sender, question, **kwargs):
+    tag_names = question.tags.values_list('name', flat=True)
+    bump('feed:index', 'feed:hot', *(f'feed:tag:{name}' for name in tag_names))
+
+
+def on_question_updated(sender, question_id, **kwargs):
+    bump(f'question:{question_id}')
+
+
+def on_answer_updated(sender, answer_id, question_id, **kwargs):
+    bump(f'question:{question_id}')
@@ -0,0 +1,229 @@
+from django.core import signing
+from django.core.paginator import Paginator, Page, PageNotAnInteger, EmptyPage
+from django.db.models import Q
+from django.http import HttpRequest
+
+from app import counting
+from app.aio import run_query, gather
+
+CURSOR_SALT = 'app.pagination.cursor'
+CURSOR_PARAM = 'cursor'
+
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+def keyset_ordering(queryset):
+    """
+    Порядок сортировки queryset, пригодный для курсорной пагинации.
+
+    Последним полем должен идти уникальный id, иначе позиция в ленте неоднозначна.
+    """
+    ordering = tuple(queryset.query.order_by)
+    if not ordering or ordering[-1].lstrip('-') != 'id':
+        return None
+
+    field_names = {field.name for field in queryset.model._meta.concrete_fields}
+    if any(name.lstrip('-') not in field_names for name in ordering):
+        return None
+    return ordering
+
+
+class KeysetPage:
+    is_keyset = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Пагинация по ключу сортировки, например (created_at, id), без COUNT(*) и OFFSET"""
+
+    def __init__(self, queryset, per_page, ordering=None):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = ordering or keyset_ordering(queryset)
+        if self.ordering is None:
+            raise ValueError('Keyset pagination requires an ordering that ends with id')
+
+        opts = queryset.model._meta
+        self.fields = [opts.get_field(name.lstrip('-')) for name in self.ordering]
+        self.descending = [name.startswith('-') for name in self.ordering]
+
+    def encode(self, obj, direction=FORWARD):
+        """Непрозрачный подписанный токен позиции obj в ленте"""
+        values = [field.value_to_string(obj) for field in self.fields]
+        return signing.dumps({'k': values, 'd': direction}, salt=CURSOR_SALT, compress=True)
+
+    def decode(self, cursor):
+        """Позиция и направление из токена; (None, FORWARD) для пустого или подделанного токена"""
+        if not cursor:
+            return None, FORWARD
+        try:
+            data = signing.loads(cursor, salt=CURSOR_SALT)
+            values = [field.to_python(value) for field, value in zip(self.fields, data['k'], strict=True)]
+            direction = BACKWARD if data['d'] == BACKWARD else FORWARD
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            return None, FORWARD
+        return values, direction
+
+    def seek_filter(self, values, backward=False):
+        """Условие «строго после позиции values» в порядке сортировки (или до неё при backward)"""
+        condition = Q()
+        for i, field in enumerate(self.fields):
+            lookup = 'lt' if self.descending[i] != backward else 'gt'
+            step = Q(**{f'{field.name}__{lookup}': values[i]})
+            for prev_field, prev_value in zip(self.fields[:i], values[:i]):
+                step &= Q(**{prev_field.name: prev_value})
+            condition |= step
+        return condition
+
+    def page(self, cursor=None):
+        values, direction = self.decode(cursor)
+        backward = direction == BACKWARD
+
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self.seek_filter(values, backward))
+
+        if backward:
+            reversed_ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+            queryset = queryset.order_by(*reversed_ordering)
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if backward:
+            rows.reverse()
+            has_next, has_previous = values is not None, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode(rows[-1], FORWARD) if rows and has_next else None,
+            previous_cursor=self.encode(rows[0], BACKWARD) if rows and has_previous else None,
+        )
+
+
+def page_rows(objects_list, number, per_page):
+    bottom = (number - 1) * per_page
+    return list(objects_list[bottom:bottom + per_page])
+
+
+def requested_page(request: HttpRequest):
+    try:
+        return max(int(request.GET.get('page', 1)), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def page_number(paginator, request: HttpRequest):
+    """Номер страницы из запроса, приведённый к диапазону paginator"""
+    try:
+        return paginator.validate_number(request.GET.get('page', 1))
+    except PageNotAnInteger:
+        return 1
+    except EmptyPage:
+        return paginator.num_pages
+
+
+def counted_paginator(objects_list, per_page, total):
+    paginator = Paginator(objects_list, per_page)
+    paginator.count = total.value
+    return paginator
+
+
+def finish_page(page, objects_list, per_page, ordering, estimated=False):
+    page.is_keyset = False
+    page.count_estimated = estimated
+    # Номера вокруг текущей без перебора page_range: по оценке страниц может быть очень много
+    page.nearby_numbers = range(max(page.number - 2, 2), min(page.number + 3, page.paginator.num_pages))
+    page.next_cursor = None
+    if ordering and page.has_next():
+        page.next_cursor = KeysetPaginator(objects_list, per_page, ordering).encode(page[-1])
+    return page
+
+
+def paginate(objects_list, request: HttpRequest, per_page=3):
+    page = cursor_page(objects_list, request, per_page)
+    if page is not None:
+        return page
+
+    total = counting.count(objects_list)
+    paginator = counted_paginator(objects_list, per_page, total)
+    page = paginator.page(page_number(paginator, request))
+
+    if total.estimated and page.number > 1 and not page:
+        # Оценка завысила число объектов и страница пуста - считаем точно
+        total = counting.recount(objects_list)
+        paginator = counted_paginator(objects_list, per_page, total)
+        page = paginator.page(page_number(paginator, request))
+
+    return finish_page(page, objects_list, per_page, keyset_ordering(objects_list), total.estimated)
+
+
+def cursor_page(objects_list, request: HttpRequest, per_page):
+    """Страница по курсору из запроса или None, если курсора нет или порядок ему не подходит"""
+    ordering = keyset_ordering(objects_list)
+    cursor = request.GET.get(CURSOR_PARAM)
+    if ordering and cursor:
+        return KeysetPaginator(objects_list, per_page, ordering).page(cursor)
+    return None
+
+
+async def page_from_rows(objects_list, request: HttpRequest, per_page, total, rows):
+    """
+    Страница из уже выбранных строк номера requested_page и известного числа объектов (Total).
+
+    Если номер оказался вне диапазона, строки последней страницы дочитываются отдельным запросом;
+    если по завышенной оценке страница вышла пустой, число объектов пересчитывается точно.
+    """
+    paginator = counted_paginator(objects_list, per_page, total)
+    number = page_number(paginator, request)
+
+    if total.estimated and number > 1 and number == requested_page(request) and not rows:
+        total = await run_query(counting.recount, objects_list)
+        paginator = counted_paginator(objects_list, per_page, total)
+        number = page_number(paginator, request)
+
+    if number != requested_page(request):
+        rows = await run_query(page_rows, objects_list, number, per_page)
+
+    page = Page(rows, number, paginator)
+    return finish_page(page, objects_list, per_page, keyset_ordering(objects_list), total.estimated)
+
+
+async def apaginate(objects_list, request: HttpRequest, per_page=3):
+    """paginate для асинхронных view: число объектов и строки запрошенной страницы выбираются одновременно"""
+    if keyset_ordering(objects_list) and request.GET.get(CURSOR_PARAM):
+        return await run_query(cursor_page, objects_list, request, per_page)
+
+    total, rows = await gather(
+        (counting.count, objects_list),
+        (page_rows, objects_list, requested_page(request), per_page),
+    )
+    return await page_from_rows(objects_list, request, per_page, total, rows)
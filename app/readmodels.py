@@ -0,0 +1,60 @@
+from django.http import Http404
+
+from app.aio import gather, run_query
+from app import viewer
+from app.counting import Total
+from app.models import Question, Answer
+from app.pagination import KeysetPage, cursor_page, page_from_rows, page_rows, requested_page
+
+
+class QuestionDetail:
+    """Данные страницы вопроса: вопрос и страница ответов с отметками лайков зрителя (viewer_liked)"""
+
+    def __init__(self, question, page):
+        self.question = question
+        self.page = page
+
+    @property
+    def answers(self):
+        return self.page.object_list
+
+    @property
+    def answers_count(self):
+        return self.question.answers_count
+
+
+def load_question(question_id):
+    question = Question.objects.select_related('author').filter(pk=question_id).first()
+    if question is None:
+        raise Http404('No question matches the given query.')
+    return question
+
+
+def load_answers_page(answers, request, per_page):
+    """Курсорная страница или строки страницы с номером из запроса, число ответов возьмётся из вопроса"""
+    page = cursor_page(answers, request, per_page)
+    if page is None:
+        return page_rows(answers, requested_page(request), per_page)
+    return page
+
+
+async def question_detail(request, question_id, per_page, user):
+    """
+    Страница вопроса за фиксированное число запросов при любом размере страницы.
+
+    Вопрос с автором и ответы страницы с авторами выбираются одновременно; общее число ответов
+    берётся из денормализованного answers_count вместо COUNT(*). Лайки зрителя на вопросе
+    и всех ответах страницы - один запрос. Теги дозагружает карточка вопроса, только если
+    её разметки нет в кэше. user - awaitable с пользователем запроса.
+    """
+    answers = Answer.objects.filter(question_id=question_id).best_answers()
+
+    question, page = await gather(
+        (load_question, question_id),
+        (load_answers_page, answers, request, per_page),
+    )
+    if not isinstance(page, KeysetPage):
+        page = await page_from_rows(answers, request, per_page, Total(question.answers_count), page)
+
+    await run_query(viewer.overlay, await user, question=[question], answer=page.object_list)
+    return QuestionDetail(question, page)
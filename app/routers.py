@@ -0,0 +1,108 @@
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+_current = ContextVar('replica_routing', default=None)
+
+# SQL отставания реплики PostgreSQL в секундах; 0, если реплика догнала мастер
+PG_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+# Сессия, не найденная на отстающей реплике, удаляется вместе с cookie, поэтому сессии читаются с мастера
+PRIMARY_ONLY_APPS = {'sessions'}
+
+# alias -> (время проверки, отставание или None, если реплика недоступна); своё у каждого процесса
+_lag_checks = {}
+
+
+class RoutingState:
+    """Маршрутизация одного запроса: читать ли с мастера и была ли запись"""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def current():
+    return _current.get()
+
+
+def activate(state):
+    return _current.set(state)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def replica_lag(alias):
+    """Отставание реплики в секундах (None - недоступна), не чаще раза в REPLICA_LAG_CHECK_INTERVAL"""
+    checked_at, lag = _lag_checks.get(alias, (None, None))
+    now = time.monotonic()
+    if checked_at is not None and now - checked_at < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return lag
+
+    connection = connections[alias]
+    try:
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(PG_LAG_SQL)
+                lag = float(cursor.fetchone()[0])
+        else:
+            lag = 0.0
+    except DatabaseError:
+        lag = None
+
+    _lag_checks[alias] = (now, lag)
+    return lag
+
+
+def healthy_replicas():
+    return [
+        alias for alias in settings.REPLICA_DATABASES
+        if (lag := replica_lag(alias)) is not None and lag <= settings.REPLICA_MAX_LAG
+    ]
+
+
+class ReplicaRouter:
+    """
+    Чтение в рамках запроса - с реплик, запись и всё остальное - на мастер.
+
+    Запрос читает с мастера, если он пишет (не GET/HEAD), если сессия недавно писала
+    (см. ReplicaPinningMiddleware), внутри транзакции на мастере и когда все реплики отстают
+    больше REPLICA_MAX_LAG секунд. Сессии всегда читаются с мастера.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = current()
+        if state is None or state.pinned or not settings.REPLICA_DATABASES:
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+
+        replicas = healthy_replicas()
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = current()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и мастер
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,100 @@
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BooleanField, Count, FloatField, Max, Sum
+from django.db.models.expressions import RawSQL
+
+from app.models import Question, SearchPosting
+
+SEARCH_CONFIG = 'english'
+
+TITLE_WEIGHT = 3
+CONTENT_WEIGHT = 1
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """Нормализованные термины текста для инвертированного индекса"""
+    return [
+        token for token in TOKEN_RE.findall((text or '').lower())
+        if MIN_TERM_LENGTH <= len(token) <= MAX_TERM_LENGTH
+    ]
+
+
+def uses_postgres():
+    backend = settings.SEARCH_BACKEND
+    if backend == 'auto':
+        return connection.vendor == 'postgresql'
+    return backend == 'postgres'
+
+
+def build_postings(question):
+    weights = {}
+    for term in tokenize(question.title):
+        weights[term] = weights.get(term, 0) + TITLE_WEIGHT
+    for term in tokenize(question.content):
+        weights[term] = weights.get(term, 0) + CONTENT_WEIGHT
+
+    return [SearchPosting(term=term, question_id=question.id, weight=weight) for term, weight in weights.items()]
+
+
+def index_question(question):
+    """Обновление записей индекса для одного вопроса (на PostgreSQL колонка tsvector обновляется сама)"""
+    if uses_postgres():
+        return
+
+    with transaction.atomic():
+        SearchPosting.objects.filter(question_id=question.id).delete()
+        SearchPosting.objects.bulk_create(build_postings(question))
+
+
+def rebuild_index(chunk_size=5000):
+    """Полная перестройка инвертированного индекса диапазонами id"""
+    if uses_postgres():
+        return 0
+
+    max_id = Question.all_objects.aggregate(max_id=Max('id'))['max_id'] or 0
+    indexed = 0
+
+    for start in range(0, max_id + 1, chunk_size):
+        questions = Question.all_objects.filter(id__gte=start, id__lt=start + chunk_size).only('id', 'title', 'content')
+        postings = [posting for question in questions for posting in build_postings(question)]
+
+        with transaction.atomic():
+            SearchPosting.objects.filter(question_id__gte=start, question_id__lt=start + chunk_size).delete()
+            SearchPosting.objects.bulk_create(postings, batch_size=2000)
+
+        indexed += len(postings)
+
+    return indexed
+
+
+def search_questions(query):
+    """Активные вопросы, подходящие под запрос, в порядке релевантности"""
+    questions = Question.objects.new_questions()
+
+    if uses_postgres():
+        if not tokenize(query):
+            return questions.none()
+
+        vector = f'{connection.ops.quote_name(Question._meta.db_table)}."search_vector"'
+        params = (SEARCH_CONFIG, query)
+        return questions.filter(
+            RawSQL(f'{vector} @@ websearch_to_tsquery(%s, %s)', params, output_field=BooleanField())
+        ).annotate(
+            rank=RawSQL(f'ts_rank_cd({vector}, websearch_to_tsquery(%s, %s))', params, output_field=FloatField())
+        ).order_by('-rank', '-id')
+
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not terms:
+        return questions.none()
+
+    return questions.filter(searchposting__term__in=terms).annotate(
+        matched_terms=Count('searchposting'),
+        rank=Sum('searchposting__weight')
+    ).filter(matched_terms=len(terms)).order_by('-rank', '-id')
@@ -0,0 +1,60 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from app.models import Tag, UserProfile
+
+SNAPSHOT_KEY = 'sidebar:snapshot'
+LOCK_KEY = 'sidebar:lock'
+COLD_START_WAIT = 2
+
+
+def build_snapshot():
+    """Подсчёт популярных тегов и лучших пользователей"""
+    popular_tags = Tag.objects.order_by('-questions_count')[:10]
+
+    best_members = UserProfile.objects.best_members(5)
+
+    return {
+        'tags': [tag.name for tag in popular_tags],
+        'members': [member.user.username for member in best_members],
+        'built_at': time.time(),
+    }
+
+
+def rebuild_snapshot():
+    """Пересчёт снимка и запись его в кэш"""
+    snapshot = build_snapshot()
+    cache.set(SNAPSHOT_KEY, snapshot, settings.SIDEBAR_CACHE_TTL + settings.SIDEBAR_CACHE_STALE_TTL)
+    return snapshot
+
+
+def get_snapshot():
+    """
+    Снимок сайдбара из кэша.
+
+    Просроченный снимок пересчитывает только процесс, захвативший блокировку,
+    остальные до окончания пересчёта отдают устаревшие данные.
+    """
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is not None and time.time() - snapshot['built_at'] < settings.SIDEBAR_CACHE_TTL:
+        return snapshot
+
+    if cache.add(LOCK_KEY, True, settings.SIDEBAR_LOCK_TIMEOUT):
+        try:
+            return rebuild_snapshot()
+        finally:
+            cache.delete(LOCK_KEY)
+
+    if snapshot is not None:
+        return snapshot
+
+    deadline = time.monotonic() + COLD_START_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        snapshot = cache.get(SNAPSHOT_KEY)
+        if snapshot is not None:
+            return snapshot
+
+    return build_snapshot()
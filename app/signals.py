@@ -0,0 +1,11 @@
+from django.dispatch import Signal
+
+# Изменились данные, которые видно на карточке вопроса: счётчики, текст, теги.
+# Аргументы: question_id
+question_updated = Signal()
+
+# Изменились данные карточки ответа. Аргументы: answer_id, question_id
+answer_updated = Signal()
+
+# Опубликован новый вопрос. Аргументы: question
+question_created = Signal()
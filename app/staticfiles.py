@@ -0,0 +1,122 @@
+import gzip
+import mimetypes
+import os
+import threading
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.map', '.txt', '.xml', '.html', '.ico')
+# Маленьким файлам сжатие почти ничего не даёт
+MIN_COMPRESS_SIZE = 256
+
+# Кодировки в порядке предпочтения и расширения их файлов рядом с исходным
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def compress_file(path):
+    """Сжатые варианты path (.br при установленном brotli, .gz), если они меньше исходного файла"""
+    with open(path, 'rb') as file:
+        data = file.read()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return []
+
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data)
+
+    written = []
+    for suffix, compressed in variants.items():
+        if len(compressed) < len(data):
+            with open(path + suffix, 'wb') as file:
+                file.write(compressed)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Имена файлов с хэшем содержимого и рядом сжатые .br/.gz варианты для StaticFilesMiddleware.
+
+    Сжатие выполняется в collectstatic после хэширования. Пока collectstatic не запускался
+    (разработка, тесты), ссылки ведут на исходные имена файлов.
+    """
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+
+        for root, _, files in os.walk(self.location):
+            for name in files:
+                if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                    compress_file(os.path.join(root, name))
+
+
+class StaticFile:
+    """Файл из STATIC_ROOT со сжатыми вариантами: кодировка -> (содержимое, ETag)"""
+
+    def __init__(self, path, immutable):
+        stat = os.stat(path)
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.last_modified = http_date(stat.st_mtime)
+        self.cache_control = IMMUTABLE_CACHE_CONTROL if immutable else f'public, max-age={settings.STATIC_MAX_AGE}'
+
+        self.variants = {}
+        for encoding, suffix in (('identity', ''), *ENCODINGS):
+            if os.path.isfile(path + suffix):
+                with open(path + suffix, 'rb') as file:
+                    content = file.read()
+                self.variants[encoding] = (content, f'"{stat.st_size:x}-{stat.st_mtime_ns:x}-{encoding}"')
+
+
+# Файлы после collectstatic не меняются, поэтому каждый процесс читает их с диска один раз
+_files = {}
+_lock = threading.Lock()
+
+
+@receiver(setting_changed)
+def on_static_settings_changed(setting, **kwargs):
+    if setting in ('STATIC_ROOT', 'STATIC_URL', 'STORAGES', 'STATIC_MAX_AGE'):
+        _files.clear()
+
+
+def immutable_names():
+    """Имена с хэшем содержимого из манифеста collectstatic"""
+    return set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+
+def load(root, name, immutable):
+    """StaticFile для имени из URL в каталоге root или None, если файла нет или имя выходит за root"""
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, name))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path) or path.endswith(('.gz', '.br')):
+        return None
+    return StaticFile(path, immutable)
+
+
+def find(name):
+    """StaticFile из STATIC_ROOT, закэшированный в процессе"""
+    if name in _files:
+        return _files[name]
+
+    static_file = load(settings.STATIC_ROOT, name, name in immutable_names())
+    if static_file is not None:
+        with _lock:
+            _files[name] = static_file
+    return static_file
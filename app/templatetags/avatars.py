@@ -0,0 +1,25 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+from app import avatars
+
+register = template.Library()
+
+# Картинка для пользователей без загруженной аватарки
+DEFAULT_AVATAR = 'img/Ask_avatar.png'
+
+
+@register.simple_tag
+def avatar(digest, size, css_class, alt='User Avatar'):
+    """<picture> с миниатюрой размера size: WebP и JPEG для браузеров без WebP"""
+    if not digest:
+        return format_html('<img src="{}" alt="{}" class="{}">', static(DEFAULT_AVATAR), alt, css_class)
+
+    urls = avatars.urls(digest, size)
+    pixels = avatars.SIZES[size]
+    return format_html(
+        '<picture><source srcset="{}" type="image/webp">'
+        '<img src="{}" alt="{}" class="{}" width="{}" height="{}" loading="lazy"></picture>',
+        urls['webp'], urls['jpg'], alt, css_class, pixels, pixels,
+    )
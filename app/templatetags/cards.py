@@ -0,0 +1,20 @@
+from django import template
+
+from app.fragments import QUESTION_CARD, ANSWER_CARD, render_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def question_cards(context, questions):
+    return render_cards(context['request'], QUESTION_CARD, questions)
+
+
+@register.simple_tag(takes_context=True)
+def question_card(context, question):
+    return render_cards(context['request'], QUESTION_CARD, [question], 'detailed')[0]
+
+
+@register.simple_tag(takes_context=True)
+def answer_cards(context, answers):
+    return render_cards(context['request'], ANSWER_CARD, answers)
@@ -0,0 +1,61 @@
+import json
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from app.sidebar import rebuild_snapshot
+
+
+# Соединения других потоков не видят данных, созданных в транзакции теста
+@override_settings(ASYNC_PARALLEL_QUERIES=False)
+class QueryBudgetTestCase(TestCase):
+    """
+    Тесты бюджета SQL-запросов на данных, сгенерированных fill_db.
+
+    Запросы считаются по метрикам RequestMetricsMiddleware, поэтому учитываются
+    все базы данных и все потоки, в которых выполнялся запрос. Каждый тест начинается
+    с пустым кэшем (карточки, страницы, счётчики) и свежим снимком сайдбара.
+    """
+    fill_ratio = 2
+    fill_seed = 1
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('fill_db', cls.fill_ratio, seed=cls.fill_seed, stdout=StringIO())
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        rebuild_snapshot()
+
+    def request_with_metrics(self, method, url, data=None, **extra):
+        with self.assertLogs('app.metrics', 'INFO') as logs:
+            response = getattr(self.client, method)(url, data or {}, **extra)
+
+        self.assertIn('Server-Timing', response)
+        self.assertEqual(json.loads(logs.records[-1].getMessage())['queries'], response.request_metrics.queries)
+        return response
+
+    def assertQueryBudget(self, url, budget, method='get', data=None, **extra):
+        response = self.request_with_metrics(method, url, data, **extra)
+        request_metrics = response.request_metrics
+
+        self.assertLessEqual(
+            request_metrics.queries, budget,
+            f'{method.upper()} {url} ran {request_metrics.queries} queries, budget is {budget}:\n'
+            + '\n'.join(request_metrics.fingerprints)
+        )
+        return response
+
+    def assertNoDuplicateQueries(self, url, method='get', data=None, **extra):
+        response = self.request_with_metrics(method, url, data, **extra)
+        duplicates = response.request_metrics.duplicates()
+
+        self.assertFalse(
+            duplicates,
+            f'{method.upper()} {url} repeated queries:\n'
+            + '\n'.join(f'{count}x {sql}' for sql, count in duplicates.items())
+        )
+        return response
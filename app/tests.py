@@ -1,3 +1,964 @@
-from django.test import TestCase
+import gzip
+import re
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from app import authcache, avatars, routers, signals
+from app.authcache import user_key
+from app.counting import Total, count_key
+from app.explain import seq_scans
+from app.benchmark import ClientDriver, build_scenarios, compare, run_benchmark
+from app.fragments import CSRF_SENTINEL
+from app.middleware import ReplicaPinningMiddleware
+from app.pagination import KeysetPaginator
+from app.managers import QUESTION_POINTS, ANSWER_POINTS, LIKE_POINTS
+from app.models import Question, Answer, Tag, QuestionLike, AnswerLike, UserProfile, SearchPosting, QuestionTag
+from app.sidebar import LOCK_KEY, SNAPSHOT_KEY, get_snapshot, rebuild_snapshot
+from app.testing import QueryBudgetTestCase
+from app.urls import urlpatterns
+from app.views import QuestionDetailView
+from app.votes import flush_votes
+from app.warmup import warm_up
+
+# Бюджеты SQL-запросов на запрос: (анонимный пользователь, авторизованный пользователь)
+VIEW_QUERY_BUDGETS = {
+    'index': (3, 5),
+    'hot': (3, 5),
+    'tag': (4, 5),
+    'question': (3, 5),
+    'search': (3, 5),
+    'login': (0, 1),
+    'signup': (0, 1),
+    'settings': (0, 2),
+    'ask': (0, 1),
+    'logout': (0, 3),
+    'vote_question': (0, 5),
+    'vote_answer': (0, 5),
+}
+
+POST_VIEWS = {'vote_question', 'vote_answer'}
+
+CSRF_TOKEN_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+class CounterTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.question = Question.objects.order_by('-answers_count', 'id').first()
+        self.answer = Answer.objects.filter(question=self.question).first()
+        self.client.force_login(User.objects.create_user('voter'))
+
+    def counters(self):
+        question = Question.objects.get(pk=self.question.pk)
+        answer = Answer.objects.get(pk=self.answer.pk)
+        return (question.likes_count, question.answers_count, question.rating), (answer.likes_count, answer.rating)
+
+    def assertCountersMatchRows(self):
+        (likes, answers, rating), answer_counters = self.counters()
+        self.assertEqual(likes, QuestionLike.objects.filter(question=self.question).count())
+        self.assertEqual(answers, Answer.all_objects.filter(question=self.question).count())
+        self.assertEqual(rating, likes + answers)
+        likes = AnswerLike.objects.filter(answer=self.answer).count()
+        self.assertEqual(answer_counters, (likes, likes))
+
+    def test_vote_and_answer_update_counters(self):
+        before = self.counters()
+        self.client.post(reverse('app:vote_question', kwargs={'question_id': self.question.id}), {'vote_type': 'up'})
+        self.client.post(reverse('app:vote_answer', kwargs={'answer_id': self.answer.id}), {'vote_type': 'up_a'})
+        self.client.post(reverse('app:question', kwargs={'question_id': self.question.id}), {'content': 'Answer'})
+
+        (likes, answers, rating), (answer_likes, _) = self.counters()
+        self.assertEqual((likes, answers, rating), (before[0][0] + 1, before[0][1] + 1, before[0][2] + 2))
+        self.assertEqual(answer_likes, before[1][0] + 1)
+        self.assertCountersMatchRows()
+
+        self.client.post(reverse('app:vote_question', kwargs={'question_id': self.question.id}), {'vote_type': 'down'})
+        self.assertEqual(self.counters()[0][0], before[0][0])
+        self.assertCountersMatchRows()
+
+    def test_recount_restores_counters(self):
+        before = self.counters()
+        Question.all_objects.update(likes_count=0, answers_count=0, rating=0)
+        Answer.all_objects.update(likes_count=0, rating=0)
+
+        call_command('recount_counters', chunk_size=3, stdout=StringIO())
+
+        self.assertEqual(self.counters(), before)
+        self.assertCountersMatchRows()
+
+
+class SidebarSnapshotTests(QueryBudgetTestCase):
+    def make_popular_tag(self):
+        top = Tag.objects.order_by('-questions_count').first()
+        return Tag.objects.create(name='popular', questions_count=top.questions_count + 1)
+
+    def test_fresh_snapshot_is_served_from_cache(self):
+        snapshot = get_snapshot()
+        self.make_popular_tag()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_snapshot(), snapshot)
+
+    @override_settings(SIDEBAR_CACHE_TTL=0)
+    def test_stale_snapshot_is_rebuilt(self):
+        self.make_popular_tag()
+
+        snapshot = get_snapshot()
+
+        self.assertEqual(snapshot['tags'][0], 'popular')
+        self.assertEqual(cache.get(SNAPSHOT_KEY), snapshot)
+        self.assertIsNone(cache.get(LOCK_KEY))
+
+    @override_settings(SIDEBAR_CACHE_TTL=0)
+    def test_stale_snapshot_is_served_while_another_process_rebuilds(self):
+        stale = cache.get(SNAPSHOT_KEY)
+        self.make_popular_tag()
+        cache.add(LOCK_KEY, True)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_snapshot(), stale)
+
+    def test_rebuild_command_replaces_snapshot(self):
+        self.make_popular_tag()
+
+        call_command('rebuild_sidebar', stdout=StringIO())
+
+        self.assertEqual(cache.get(SNAPSHOT_KEY)['tags'][0], 'popular')
+
+
+class KeysetPaginationTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.questions = Question.objects.new_questions().prefetch_related(None)
+        self.paginator = KeysetPaginator(self.questions, 4)
+
+    def ids(self, page):
+        return [question.id for question in page]
+
+    def test_next_and_previous_cursors_round_trip(self):
+        pages = [self.paginator.page()]
+        while pages[-1].has_next():
+            pages.append(self.paginator.page(pages[-1].next_cursor))
+
+        expected = list(self.questions.values_list('id', flat=True))
+        self.assertEqual([i for page in pages for i in self.ids(page)], expected)
+        self.assertFalse(pages[0].has_previous())
+
+        back = [pages[-1]]
+        while back[-1].has_previous():
+            back.append(self.paginator.page(back[-1].previous_cursor))
+
+        self.assertEqual([self.ids(page) for page in reversed(back)], [self.ids(page) for page in pages])
+        self.assertTrue(back[-2].has_next())
+
+    def test_feed_pages_link_back_to_previous_page(self):
+        url = reverse('app:index')
+        first = self.client.get(url).context['page']
+        second = self.client.get(url, {'cursor': first.next_cursor}).context['page']
+        back = self.client.get(url, {'cursor': second.previous_cursor}).context['page']
+
+        self.assertTrue(second.is_keyset)
+        self.assertEqual(self.ids(back), self.ids(first))
+        self.assertEqual(self.ids(second), list(self.questions.values_list('id', flat=True)[3:6]))
+
+    def test_tampered_cursor_starts_from_first_page(self):
+        cursor = self.paginator.page().next_cursor
+
+        self.assertEqual(self.ids(self.paginator.page(cursor[:-2])), self.ids(self.paginator.page()))
+
+
+class SearchTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('asker'))
+
+    def ask(self, title, text):
+        self.client.post(reverse('app:ask'), {'title': title, 'text': text, 'tags': 'zoo'})
+        return Question.objects.get(title=title).id
+
+    def search(self, query):
+        response = self.client.get(reverse('app:search'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [question.id for question in response.context['questions']]
+
+    def test_title_matches_rank_above_content_matches(self):
+        in_content = self.ask('Feeding animals', 'What does a zebra eat?')
+        in_title = self.ask('Zebra stripes', 'Why does it have stripes?')
+        in_both = self.ask('Zebra diet', 'Does a zebra eat grass?')
+
+        self.assertEqual(self.search('zebra'), [in_both, in_title, in_content])
+        self.assertEqual(self.search('ZEBRA eat'), [in_both, in_content])
+        self.assertEqual(self.search('zebra giraffe'), [])
+
+    def test_rebuilt_index_finds_the_same_questions(self):
+        question = self.ask('Giraffe necks', 'How long is a giraffe neck?')
+        SearchPosting.objects.all().delete()
+
+        call_command('rebuild_search_index', stdout=StringIO())
+
+        self.assertEqual(self.search('giraffe neck'), [question])
+
+    def test_empty_and_short_queries_find_nothing(self):
+        for query in ('', '   ', 'a', '%'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), [])
+
+
+class FillDbTests(TestCase):
+    def fill(self, **options):
+        for model in (Question, Tag, User):
+            model._base_manager.all().delete()
+        out = StringIO()
+        call_command('fill_db', 2, stdout=out, **options)
+        return out.getvalue()
+
+    def snapshot(self):
+        """Сгенерированные данные без id и времени создания, которые зависят от запуска"""
+        questions = Question.all_objects.select_related('author').prefetch_related('tags').order_by('title')
+        return [
+            (
+                question.title, question.author.username, sorted(tag.name for tag in question.tags.all()),
+                question.likes_count, question.answers_count,
+                sorted(question.answers.values_list('author__username', 'likes_count')),
+            )
+            for question in questions
+        ]
+
+    def test_same_seed_gives_same_data(self):
+        self.fill(seed=7, chunk_size=4)
+        first = self.snapshot()
+        self.fill(seed=7, chunk_size=4)
+
+        self.assertEqual(self.snapshot(), first)
+        self.assertEqual(len(first), 20)
+        self.assertEqual(sum(len(question[5]) for question in first), 200)
+
+        self.fill(seed=8, chunk_size=4)
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_workers_do_not_change_data(self):
+        self.fill(seed=7)
+        single = self.snapshot()
+
+        out = self.fill(seed=7, workers=2)
+
+        self.assertEqual(self.snapshot(), single)
+        if connection.vendor == 'sqlite':
+            self.assertIn('using 1 worker', out)
+
+
+class ViewQueryBudgetTests(QueryBudgetTestCase):
+    def setUp(self):
+        # Бюджеты считаются для холодного кэша карточек (его очищает QueryBudgetTestCase)
+        super().setUp()
+        self.user = User.objects.order_by('id').first()
+        self.question = Question.objects.new_questions().first()
+        self.answer = Answer.objects.filter(question=self.question).first()
+        self.tag = Tag.objects.order_by('id').first()
+
+    def url_for(self, name):
+        kwargs = {
+            'tag': {'tag_name': self.tag.name},
+            'question': {'question_id': self.question.id},
+            'vote_question': {'question_id': self.question.id},
+            'vote_answer': {'answer_id': self.answer.id},
+        }.get(name, {})
+        url = reverse(f'app:{name}', kwargs=kwargs)
+        return f'{url}?q=lorem' if name == 'search' else url
+
+    def request_budgeted(self, name, budget):
+        if name in POST_VIEWS:
+            return self.assertQueryBudget(self.url_for(name), budget, method='post', data={'vote_type': 'up'})
+        return self.assertQueryBudget(self.url_for(name), budget)
+
+    def test_every_view_has_budget(self):
+        self.assertEqual({pattern.name for pattern in urlpatterns}, set(VIEW_QUERY_BUDGETS))
+
+    def test_anonymous_budgets(self):
+        for name, (budget, _) in VIEW_QUERY_BUDGETS.items():
+            if name in POST_VIEWS:
+                continue
+            with self.subTest(view=name):
+                self.request_budgeted(name, budget)
+
+    def test_authenticated_budgets(self):
+        for name, (_, budget) in VIEW_QUERY_BUDGETS.items():
+            with self.subTest(view=name):
+                self.client.force_login(self.user)
+                self.request_budgeted(name, budget)
+
+    def test_tag_intersection(self):
+        first, second = Tag.objects.order_by('-questions_count', 'id')[:2]
+        expected = set(Question.objects.filter(tags=first).filter(tags=second).values_list('id', flat=True))
+
+        response = self.client.get(reverse('app:tag', kwargs={'tag_name': f'{first.name}+{second.name}'}))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual({question.id for question in response.context['questions']}, expected)
+        self.assertEqual(first.questions_count, first.questiontag_set.count())
+
+    def test_tag_with_plus_in_name(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('app:ask'), {'title': 'Templates', 'text': 'How?', 'tags': 'c++'})
+        question = Question.objects.get(title='Templates')
+
+        response = self.client.get(reverse('app:tag', kwargs={'tag_name': 'c++'}))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([q.id for q in response.context['questions']], [question.id])
+        self.assertEqual(response.context['tag_name'], 'c++')
+
+    def test_list_pages_have_no_repeated_queries(self):
+        for name in ('index', 'hot', 'tag', 'question', 'search'):
+            with self.subTest(view=name):
+                self.assertNoDuplicateQueries(self.url_for(name))
+
+
+class HotRankingTests(QueryBudgetTestCase):
+    def ask(self, title, age):
+        question = Question.objects.create(title=title, content='Text', author=User.objects.order_by('id').first())
+        Question.all_objects.filter(pk=question.pk).update(created_at=timezone.now() - age, rating=10 ** 4)
+        return question.id
+
+    def test_newer_question_ranks_above_older_with_equal_rating(self):
+        newer = self.ask('Newer', timedelta(hours=1))
+        older = self.ask('Older', timedelta(hours=10))
+
+        call_command('decay_hot_scores', all=True, stdout=StringIO())
+
+        self.assertEqual(list(Question.objects.hot_questions().values_list('id', flat=True)[:2]), [newer, older])
+        response = self.client.get(reverse('app:hot'))
+        self.assertEqual([question.id for question in response.context['questions'][:2]], [newer, older])
+
+
+class QuestionAdminTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin'))
+        self.question = Question.objects.new_questions().first()
+        self.url = reverse('admin:app_question_change', args=[self.question.id])
+
+    def form_data(self, response):
+        """POST-данные формы изменения вопроса с текущими значениями полей и inline-тегов"""
+        data = {}
+        forms = [response.context['adminform'].form]
+        for inline in response.context['inline_admin_formsets']:
+            formset = inline.formset
+            forms.extend(formset.forms)
+            data.update({
+                formset.management_form[name].html_name: formset.management_form[name].value()
+                for name in formset.management_form.fields
+            })
+        for form in forms:
+            for field in form:
+                value = field.value()
+                if value is not None and value is not False:
+                    data[field.html_name] = value
+        return data, formset
+
+    def test_inline_edits_question_tags(self):
+        new = Tag.objects.create(name='inline')
+        data, formset = self.form_data(self.client.get(self.url))
+        old = formset.forms[0].instance.tag
+        expected = {tag.id for tag in self.question.tags.all()} - {old.id} | {new.id}
+        data[f'{formset.prefix}-0-DELETE'] = 'on'
+        data[f'{formset.prefix}-{len(formset.initial_forms)}-tag'] = new.id
+
+        response = self.client.post(self.url, data)
+
+        self.assertEqual(response.status_code, 302)
+        tag_ids = QuestionTag.objects.filter(question=self.question).values_list('tag', flat=True)
+        self.assertEqual(set(tag_ids), expected)
+        question_tag = QuestionTag.objects.get(question=self.question, tag=new)
+        self.assertEqual(question_tag.question_created_at, self.question.created_at)
+        for tag in (old, new):
+            tag.refresh_from_db()
+            self.assertEqual(tag.questions_count, QuestionTag.objects.filter(tag=tag).count())
+
+
+class ParallelQueriesTests(TransactionTestCase):
+    """Запросы из потоков пула видят только закоммиченные данные, поэтому без транзакции теста"""
+
+    def setUp(self):
+        call_command('fill_db', 1, seed=1, stdout=StringIO())
+        cache.clear()
+        self.question = Question.objects.order_by('-answers_count', 'id').first()
+
+    def page_ids(self, url, key):
+        cache.clear()
+        response = self.client.get(url, {'page': 2})
+        self.assertEqual(response.status_code, 200)
+        return [obj.id for obj in response.context[key]], response.context['page'].paginator.count
+
+    def test_read_views_render_the_same_with_parallel_queries(self):
+        pages = {
+            reverse('app:index'): 'questions',
+            reverse('app:hot'): 'questions',
+            reverse('app:question', kwargs={'question_id': self.question.id}): 'answers',
+        }
+        for url, key in pages.items():
+            with self.subTest(url=url):
+                with override_settings(ASYNC_PARALLEL_QUERIES=False):
+                    sequential = self.page_ids(url, key)
+                with override_settings(ASYNC_PARALLEL_QUERIES=True):
+                    parallel = self.page_ids(url, key)
+
+                self.assertTrue(parallel[0])
+                self.assertEqual(parallel, sequential)
+
+
+class FragmentCacheTests(QueryBudgetTestCase):
+    def test_cards_are_cached_and_personalised(self):
+        url = reverse('app:index')
+        cold = self.request_with_metrics('get', url)
+        warm = self.request_with_metrics('get', url)
+
+        self.assertLess(warm.request_metrics.queries, cold.request_metrics.queries)
+        self.assertNotContains(warm, CSRF_SENTINEL)
+        self.assertContains(warm, 'name="csrfmiddlewaretoken"')
+
+    def test_vote_bumps_question_card(self):
+        question = Question.objects.new_questions().first()
+        user = User.objects.create_user('voter')
+        self.client.force_login(user)
+        self.client.get(reverse('app:index'))
+
+        self.client.post(reverse('app:vote_question', kwargs={'question_id': question.id}), {'vote_type': 'up'})
+        response = self.client.get(reverse('app:index'))
+
+        self.assertContains(response, f'<span class="vote-count">{question.likes_count + 1}</span>')
+        self.assertContains(response, 'vote-up voted')
+
+    def test_sentinels_in_user_text_are_not_replaced(self):
+        user = User.objects.create_user('writer')
+        self.client.force_login(user)
+        text = '__csrf_token__ __liked__ <__csrf_token__> <__liked__>'
+        self.client.post(reverse('app:ask'), {'title': 'Sentinels', 'text': text})
+        question = Question.objects.get(title='Sentinels')
+
+        response = self.client.get(reverse('app:question', kwargs={'question_id': question.id}))
+
+        self.assertContains(response, '__csrf_token__ __liked__ &lt;__csrf_token__&gt; &lt;__liked__&gt;')
+        self.assertNotContains(response, CSRF_SENTINEL)
+
+    def test_rename_refreshes_author_on_cards(self):
+        question = Question.objects.new_questions().first()
+        url = reverse('app:question', kwargs={'question_id': question.id})
+        self.client.force_login(question.author)
+        self.assertContains(self.client.get(url), f'by {question.author.username}')
+
+        self.client.post(reverse('app:settings'), {'login': 'renamed_author', 'email': question.author.email})
+
+        self.assertContains(self.client.get(url), 'by renamed_author')
+
+
+class QuestionDetailTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.question = Question.objects.order_by('-answers_count', 'id').first()
+        self.user = User.objects.create_user('viewer')
+        self.client.force_login(self.user)
+
+    def test_viewer_likes_come_from_one_query(self):
+        answers = list(Answer.objects.filter(question=self.question).best_answers()[:2])
+        QuestionLike.objects.create(question=self.question, user=self.user)
+        AnswerLike.objects.create(answer=answers[1], user=self.user)
+
+        response = self.request_with_metrics('get', reverse('app:question', kwargs={'question_id': self.question.id}))
+
+        self.assertTrue(response.context['question'].viewer_liked)
+        self.assertEqual([answer.viewer_liked for answer in response.context['answers'][:2]], [False, True])
+        self.assertEqual(response.context['answers_count'], self.question.answers_count)
+        self.assertFalse([sql for sql in response.request_metrics.fingerprints if 'COUNT(' in sql])
+
+    def test_posted_answer_redirects_to_its_page(self):
+        url = reverse('app:question', kwargs={'question_id': self.question.id})
+        Answer.objects.filter(question=self.question).update(likes_count=1)
+
+        response = self.client.post(url, {'content': 'My answer'})
+
+        answer = Answer.objects.get(question=self.question, content='My answer')
+        self.question.refresh_from_db()
+        ordered = list(Answer.objects.filter(question=self.question).best_answers().values_list('id', flat=True))
+        page = ordered.index(answer.id) // QuestionDetailView.paginate_by + 1
+        self.assertRedirects(response, f'{url}?page={page}#answer-{answer.id}', fetch_redirect_response=False)
+        self.assertEqual(self.question.answers_count, len(ordered))
+
+        response = self.client.get(f'{url}?page={page}')
+        self.assertContains(response, f'id="answer-{answer.id}"')
+
+    def test_out_of_range_page_shows_last_page(self):
+        url = reverse('app:question', kwargs={'question_id': self.question.id})
+        response = self.client.get(f'{url}?page=9999')
+
+        self.assertEqual(response.context['page'].number, response.context['page'].paginator.num_pages)
+        self.assertTrue(response.context['answers'])
+
+
+class ViewerStateTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('viewer')
+        self.client.force_login(self.user)
+
+    def likes_queries(self, response):
+        return [sql for sql in response.request_metrics.fingerprints if 'app_questionlike' in sql]
+
+    def test_offset_and_cursor_pages_mark_liked_questions(self):
+        first_page = self.client.get(reverse('app:index')).context['page']
+        second = Question.objects.new_questions()[3]
+        QuestionLike.objects.create(question=second, user=self.user)
+
+        response = self.request_with_metrics('get', f'{reverse("app:index")}?cursor={first_page.next_cursor}')
+
+        questions = list(response.context['questions'])
+        self.assertEqual(questions[0].id, second.id)
+        self.assertEqual([question.viewer_liked for question in questions], [True, False, False])
+        self.assertEqual(len(self.likes_queries(response)), 1)
+
+
+class PaginationCountTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.questions = Question.objects.new_questions().prefetch_related(None)
+
+    def count_queries(self, response):
+        return [sql for sql in response.request_metrics.fingerprints if sql.startswith('SELECT COUNT(')]
+
+    def test_count_is_cached(self):
+        first = self.request_with_metrics('get', reverse('app:index'))
+        second = self.request_with_metrics('get', f'{reverse("app:index")}?page=2')
+
+        self.assertTrue(self.count_queries(first))
+        self.assertEqual(self.count_queries(second), [])
+        self.assertEqual(second.context['page'].paginator.count, self.questions.count())
+
+    def test_estimated_total_is_marked_and_corrected(self):
+        cache.set(count_key(self.questions), Total(10 ** 6, estimated=True))
+
+        response = self.client.get(reverse('app:index'))
+        self.assertContains(response, '&asymp;333334')
+
+        response = self.client.get(f'{reverse("app:index")}?page=300000')
+        page = response.context['page']
+        self.assertFalse(page.count_estimated)
+        self.assertEqual(page.paginator.count, self.questions.count())
+        self.assertEqual(page.number, page.paginator.num_pages)
+        self.assertTrue(page.object_list)
+
+    def test_search_without_terms_has_empty_page(self):
+        for query in ('', 'a', '%%'):
+            with self.subTest(query=query):
+                response = self.client.get(reverse('app:search'), {'q': query})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['page'].paginator.count, 0)
+
+
+class PageCacheTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.question = Question.objects.new_questions().first()
+        self.question_url = reverse('app:question', kwargs={'question_id': self.question.id})
+
+    def test_anonymous_pages_are_cached_per_visitor_token(self):
+        self.assertEqual(self.client.get(self.question_url)['X-Page-Cache'], 'MISS')
+
+        response = self.request_with_metrics('get', self.question_url)
+        other = Client().get(self.question_url)
+
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertEqual(other['X-Page-Cache'], 'HIT')
+        self.assertEqual(response.request_metrics.queries, 0)
+        self.assertIn('Cookie', response['Vary'])
+        self.assertNotContains(other, CSRF_SENTINEL)
+        self.assertNotEqual(
+            CSRF_TOKEN_RE.search(response.content.decode()).group(1),
+            CSRF_TOKEN_RE.search(other.content.decode()).group(1),
+        )
+
+    def test_other_parameters_and_logged_in_users_bypass_cache(self):
+        self.assertNotIn('X-Page-Cache', self.client.get(reverse('app:index') + '?utm=1'))
+        self.client.force_login(User.objects.order_by('id').first())
+        self.assertNotIn('X-Page-Cache', self.client.get(reverse('app:index')))
+
+    def test_vote_and_new_question_invalidate_pages(self):
+        self.client.get(self.question_url)
+        self.client.get(reverse('app:index'))
+
+        voter = Client()
+        voter.force_login(User.objects.create_user('voter'))
+        voter.post(reverse('app:vote_question', kwargs={'question_id': self.question.id}), {'vote_type': 'up'})
+        voter.post(reverse('app:ask'), {'title': 'New', 'text': 'Question', 'tags': 'fresh'})
+
+        self.assertEqual(self.client.get(self.question_url)['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.client.get(reverse('app:index'))['X-Page-Cache'], 'MISS')
+
+
+class ReputationTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = UserProfile.objects.create(user=User.objects.create_user('author'))
+        self.voter = User.objects.create_user('voter')
+
+    def profile(self):
+        return UserProfile.objects.get(pk=self.author.pk)
+
+    def test_counters_follow_ask_answer_and_vote(self):
+        self.client.force_login(self.author.user)
+        self.client.post(reverse('app:ask'), {'title': 'Title', 'text': 'Text', 'tags': 'python'})
+        question = Question.objects.get(author=self.author.user)
+        self.client.post(reverse('app:question', kwargs={'question_id': question.id}), {'content': 'Answer'})
+
+        self.client.force_login(self.voter)
+        self.client.post(reverse('app:vote_question', kwargs={'question_id': question.id}), {'vote_type': 'up'})
+
+        profile = self.profile()
+        self.assertEqual((profile.questions_count, profile.answers_count, profile.likes_received), (1, 1, 1))
+        self.assertEqual(profile.reputation, QUESTION_POINTS + ANSWER_POINTS + LIKE_POINTS)
+
+        UserProfile.objects.update(questions_count=0, answers_count=0, likes_received=0, reputation=0)
+        call_command('recount_reputation', chunk_size=2, stdout=StringIO())
+        self.assertEqual(self.profile().reputation, profile.reputation)
+
+    def test_sidebar_lists_members_by_reputation(self):
+        UserProfile.objects.filter(pk=self.author.pk).update(reputation=10 ** 6)
+
+        self.assertEqual(rebuild_snapshot()['members'][0], 'author')
+
+
+class VoteTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.question = Question.objects.new_questions().first()
+        self.user = User.objects.create_user('voter')
+        self.client.force_login(self.user)
+
+    def vote(self, vote_type):
+        url = reverse('app:vote_question', kwargs={'question_id': self.question.id})
+        return self.client.post(url, {'vote_type': vote_type}, HTTP_ACCEPT='application/json').json()
+
+    def test_json_vote_returns_new_count(self):
+        self.assertEqual(self.vote('up')['likes_count'], self.question.likes_count + 1)
+        self.assertEqual(self.vote('up')['likes_count'], self.question.likes_count + 1)
+        self.assertEqual(self.vote('down')['likes_count'], self.question.likes_count)
+
+    @override_settings(VOTE_BUFFER_ENABLED=True)
+    def test_buffered_votes_are_flushed_in_bulk(self):
+        self.vote('up')
+        self.vote('down')
+        self.assertEqual(self.vote('up')['likes_count'], self.question.likes_count + 1)
+        self.assertFalse(QuestionLike.objects.filter(question=self.question, user=self.user).exists())
+
+        self.assertEqual(flush_votes(), 1)
+
+        self.question.refresh_from_db()
+        self.assertTrue(QuestionLike.objects.filter(question=self.question, user=self.user).exists())
+        self.assertEqual(self.question.likes_count, QuestionLike.objects.filter(question=self.question).count())
+        self.assertEqual(self.vote('up')['likes_count'], self.question.likes_count)
+
+
+class StaticFilesTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        override = override_settings(STATIC_ROOT=root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.url = staticfiles_storage.url('css/base.css')
+
+    def test_hashed_gzip_with_immutable_cache(self):
+        self.assertRegex(self.url, r'^/static/css/base\.[0-9a-f]{12}\.css$')
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        with open(settings.STATICFILES_DIRS[0] + '/css/base.css', 'rb') as file:
+            self.assertEqual(gzip.decompress(response.content), file.read())
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_and_unhashed_name(self):
+        response = self.client.get('/static/css/base.css', HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(len(response.content), 10)
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100000-')
+        self.assertEqual(response.status_code, 416)
+
+    async def test_async_stack_serves_files(self):
+        response = await self.async_client.get(self.url, headers={'accept-encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+        response = await self.async_client.get('/static/css/missing.css')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(REPLICA_DATABASES=['replica_1', 'replica_2'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        self.set_lag(replica_1=0.0, replica_2=0.0)
+
+    def tearDown(self):
+        routers._lag_checks.clear()
+
+    def set_lag(self, **lags):
+        routers._lag_checks.update({alias: (time.monotonic(), lag) for alias, lag in lags.items()})
+
+    def read_db(self, state):
+        token = routers.activate(state)
+        try:
+            return self.router.db_for_read(Question)
+        finally:
+            routers.deactivate(token)
+
+    def test_reads_go_to_healthy_replicas(self):
+        self.assertIn(self.read_db(routers.RoutingState()), {'replica_1', 'replica_2'})
+        self.set_lag(replica_1=60.0, replica_2=None)
+        self.assertEqual(self.read_db(routers.RoutingState()), 'default')
+
+    def test_pinned_and_background_reads_use_primary(self):
+        self.assertEqual(self.read_db(routers.RoutingState(pinned=True)), 'default')
+        self.assertEqual(self.router.db_for_read(Question), 'default')
+
+    def test_write_pins_session_to_primary(self):
+        def view(request):
+            self.assertTrue(routers.current().pinned)
+            self.router.db_for_write(QuestionLike)
+            return HttpResponse()
+
+        middleware = ReplicaPinningMiddleware(view)
+        response = middleware(RequestFactory().post('/question/1/vote/'))
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE_NAME]
+
+        request = RequestFactory().get('/')
+        request.COOKIES[settings.REPLICA_PIN_COOKIE_NAME] = cookie.value
+        self.assertTrue(middleware.state_for(request).pinned)
+        self.assertFalse(middleware.state_for(RequestFactory().get('/')).pinned)
+
+
+class ConditionalGetTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.question = Question.objects.new_questions().first()
+
+    def etag_for(self, url):
+        first = self.client.get(url)
+        # Страница из кэша страниц отдаёт ту же версию, что и view
+        second = self.client.get(url)
+        self.assertEqual(second['X-Page-Cache'], 'HIT')
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(second['Last-Modified'], first['Last-Modified'])
+        return first['ETag']
+
+    def test_unchanged_question_page_is_not_modified(self):
+        url = reverse('app:question', kwargs={'question_id': self.question.id})
+        etag = self.etag_for(url)
+
+        response = self.request_with_metrics('get', url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertLessEqual(response.request_metrics.queries, 1)
+
+        signals.answer_updated.send(sender=Answer, answer_id=0, question_id=self.question.id)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_feed_changes_with_any_question(self):
+        url = reverse('app:index')
+        etag = self.etag_for(url)
+
+        response = self.request_with_metrics('get', url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.request_metrics.queries, 0)
+
+        signals.question_updated.send(sender=Question, question_id=self.question.id)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_rename_changes_pages_of_that_user(self):
+        url = reverse('app:index')
+        user = User.objects.create_user('viewer')
+        self.client.force_login(user)
+        other = Client()
+        other.force_login(User.objects.create_user('other'))
+        etag, other_etag = self.client.get(url)['ETag'], other.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.post(reverse('app:settings'), {'login': 'renamed'})
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'renamed')
+        self.assertEqual(other.get(url, HTTP_IF_NONE_MATCH=other_etag).status_code, 304)
+
+
+@override_settings(AVATAR_WORKERS=0)
+class AvatarTests(QueryBudgetTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        super().setUp()
+        self.user = Question.objects.new_questions().first().author
+        self.client.force_login(self.user)
+
+    def upload(self, name='avatar.png', image_format='PNG', size=(600, 400)):
+        buffer = BytesIO()
+        Image.new('RGBA', size, (200, 30, 30, 128)).save(buffer, image_format)
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def post_avatar(self, upload):
+        return self.client.post(reverse('app:settings'), {
+            'login': self.user.username, 'email': self.user.email, 'avatar': upload,
+        })
+
+    def test_upload_publishes_thumbnails_on_cards(self):
+        self.assertRedirects(self.post_avatar(self.upload()), reverse('app:index'))
+
+        digest = UserProfile.objects.get(user=self.user).avatar_hash
+        self.assertTrue(digest)
+        for size in avatars.SIZES.values():
+            with Image.open(f'{settings.MEDIA_ROOT}/{avatars.thumbnail_name(digest, size, "webp")}') as thumbnail:
+                self.assertEqual(thumbnail.size, (size, size))
+        self.assertFalse(Question.objects.filter(author=self.user).exclude(author_avatar=digest).exists())
+
+        url = avatars.urls(digest, 'medium')['webp']
+        self.assertContains(self.client.get(reverse('app:index')), url)
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_invalid_upload_is_rejected(self):
+        response = self.post_avatar(SimpleUploadedFile('avatar.png', b'not an image'))
+        self.assertContains(response, 'Avatar must be a JPEG, PNG, WebP or GIF image.')
+
+        with override_settings(AVATAR_MAX_SIDE=100):
+            response = self.post_avatar(self.upload())
+        self.assertContains(response, 'Avatar must be at most 100px on each side.')
+        self.assertEqual(UserProfile.objects.get(user=self.user).avatar_hash, '')
+
+    def test_header_shows_avatar_of_cached_user(self):
+        self.assertContains(self.client.get(reverse('app:index')), 'img/Ask_avatar.png')
+
+        avatars.publish(self.user.id, 'f' * 32, {})
+
+        self.assertContains(self.client.get(reverse('app:index')), avatars.urls('f' * 32, 'small')['webp'])
+
+
+class AuthCacheTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.order_by('id').first()
+        self.client.force_login(self.user)
+
+    def auth_queries(self, response):
+        tables = ('FROM "auth_user"', 'FROM "django_session"')
+        return [sql for sql in response.request_metrics.fingerprints if any(table in sql for table in tables)]
+
+    def test_repeated_page_views_skip_auth_queries(self):
+        first = self.request_with_metrics('get', reverse('app:index'))
+        second = self.request_with_metrics('get', reverse('app:index'))
+
+        self.assertTrue(self.auth_queries(first))
+        self.assertEqual(self.auth_queries(second), [])
+        self.assertEqual(second.context['user'], self.user)
+
+    def test_settings_update_invalidates_cached_user(self):
+        self.client.get(reverse('app:index'))
+        self.client.post(reverse('app:settings'), {'login': 'renamed'})
+
+        response = self.client.get(reverse('app:index'))
+        self.assertEqual(response.context['user'].username, 'renamed')
+
+    def test_sessions_of_plain_model_backend_stay_logged_in(self):
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+
+        response = self.client.get(reverse('app:index'))
+
+        self.assertEqual(response.context['user'], self.user)
+
+    def test_login_uses_cached_backend(self):
+        self.client.logout()
+        self.client.post(reverse('app:login'), {'login': 'anyone', 'password': '123'})
+
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], authcache.BACKEND)
+
+    def test_logout_forgets_cached_user(self):
+        self.client.get(reverse('app:index'))
+        self.client.get(reverse('app:logout'))
+
+        self.assertIsNone(cache.get(user_key(self.user.pk)))
+
+
+class ExplainQueriesTests(QueryBudgetTestCase):
+    def test_manager_queries_use_indexes(self):
+        out = StringIO()
+        call_command('explain_queries', fail_on_seq_scan=True, stdout=out)
+
+        self.assertIn('No sequential scans', out.getvalue())
+
+    def test_seq_scans_are_detected(self):
+        plan = '3 0 0 SCAN app_question\n6 0 0 SCAN app_answer USING INDEX answer_best_idx'
+
+        self.assertEqual(seq_scans(plan, 'sqlite'), ['app_question'])
+        self.assertEqual(seq_scans('Seq Scan on app_question  (cost=0.00..1.00 rows=1 width=4)', 'postgresql'), ['app_question'])
+
+
+class WarmUpTests(QueryBudgetTestCase):
+    def test_warm_up_runs_every_step(self):
+        self.assertEqual(set(warm_up()), {'db', 'urls', 'templates', 'sidebar'})
+
+    def test_server_timing_reports_connections(self):
+        response = self.client.get(reverse('app:index'))
+        self.assertIn('conn;dur=', response['Server-Timing'])
+
+
+class BenchmarkTests(QueryBudgetTestCase):
+    @override_settings(ALLOWED_HOSTS=['localhost', '127.0.0.1'])
+    def test_report_covers_every_scenario(self):
+        scenarios = build_scenarios()
+        report = run_benchmark(ClientDriver(User.objects.order_by('id').first()), scenarios, requests=3, warmup=1)
+
+        self.assertEqual(set(report['routes']), {scenario.name for scenario in scenarios})
+        for name, route in report['routes'].items():
+            with self.subTest(route=name):
+                self.assertEqual(route['errors'], 0)
+                self.assertLessEqual(route['p50_ms'], route['p95_ms'])
+                self.assertLessEqual(route['p95_ms'], route['p99_ms'])
+                self.assertIsNotNone(route['queries_per_request'])
+        # После прогрева страница берётся из кэша страниц без запросов, а *_uncached доходит до view
+        self.assertEqual(report['routes']['index']['queries_per_request'], 0)
+        self.assertGreater(report['routes']['index_uncached']['queries_per_request'], 0)
+
+    def test_compare_flags_regressions(self):
+        def route(p95_ms, queries, errors=0):
+            return {'routes': {'index': {
+                'requests': 10, 'errors': errors, 'p95_ms': p95_ms, 'queries_per_request': queries,
+            }}}
+
+        baseline = route(10.0, 3.0)
+        self.assertEqual(compare(route(11.0, 3.0), baseline, threshold=0.2), [])
+        self.assertEqual(len(compare(route(20.0, 5.0), baseline, threshold=0.2)), 2)
+        # Ошибки - регрессия, даже если с ними быстрее
+        self.assertEqual(compare(route(1.0, 0.0, errors=10), baseline, threshold=0.2), ['index: 10 of 10 requests failed'])
@@ -0,0 +1,38 @@
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# Расширение файла -> формат Pillow и параметры сохранения
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+def flatten(image):
+    """RGB-изображение: прозрачность заливается белым, палитра и ч/б переводятся в RGB"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render(data, sizes):
+    """
+    Квадратные миниатюры каждого размера во всех FORMATS: {(размер, расширение): байты}.
+
+    Функция без Django, чтобы её можно было выполнять в отдельном процессе.
+    """
+    with Image.open(BytesIO(data)) as image:
+        image = flatten(ImageOps.exif_transpose(image))
+
+    rendered = {}
+    for size in sizes:
+        thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        for extension, (image_format, options) in FORMATS.items():
+            buffer = BytesIO()
+            thumbnail.save(buffer, image_format, **options)
+            rendered[size, extension] = buffer.getvalue()
+    return rendered
@@ -2,7 +2,7 @@ from django.urls import path
 from app.views import (
     IndexView, HotQuestionsView, TagQuestionsView, QuestionDetailView,
     LoginView, SignupView, SettingsView, AskQuestionView,
-    LogoutView, VoteQuestionView, VoteAnswerView
+    LogoutView, VoteQuestionView, VoteAnswerView, SearchView
 )
 
 app_name = 'app'
@@ -12,6 +12,7 @@ urlpatterns = [
     path('hot/', HotQuestionsView.as_view(), name='hot'),
     path('tag/<str:tag_name>/', TagQuestionsView.as_view(), name='tag'),
     path('question/<int:question_id>/', QuestionDetailView.as_view(), name='question'),
+    path('search/', SearchView.as_view(), name='search'),
     path('login/', LoginView.as_view(), name='login'),
     path('signup/', SignupView.as_view(), name='signup'),
     path('settings/', SettingsView.as_view(), name='settings'),
@@ -0,0 +1,47 @@
+from django.db.models import CharField, F, Value
+
+from app.models import QuestionLike, AnswerLike
+
+# Вид объекта -> модель лайков; поле со ссылкой на объект - <вид>_id
+LIKE_MODELS = {
+    'question': QuestionLike,
+    'answer': AnswerLike,
+}
+
+
+def liked_ids(user, **object_ids):
+    """
+    id объектов с лайком пользователя по видам: liked_ids(user, question=[...], answer=[...]).
+
+    Один запрос при любом числе видов: IN по каждому виду, объединённые через UNION ALL.
+    """
+    liked = {kind: set() for kind in object_ids}
+    if not user.is_authenticated:
+        return liked
+
+    queries = [
+        LIKE_MODELS[kind].objects.filter(user=user, **{f'{kind}_id__in': ids}).annotate(
+            kind=Value(kind, output_field=CharField()), object_id=F(f'{kind}_id'),
+        ).values_list('kind', 'object_id')
+        for kind, ids in object_ids.items() if ids
+    ]
+    if not queries:
+        return liked
+
+    for kind, object_id in queries[0].union(*queries[1:], all=True):
+        liked[kind].add(object_id)
+    return liked
+
+
+def overlay(user, **objects):
+    """
+    Состояние пользователя на объектах страницы: overlay(user, question=[...], answer=[...]).
+
+    Каждый объект получает viewer_liked. Работает с любой страницей - обычной и курсорной,
+    нужен только список объектов.
+    """
+    objects = {kind: list(items) for kind, items in objects.items()}
+    liked = liked_ids(user, **{kind: [obj.pk for obj in items] for kind, items in objects.items()})
+    for kind, items in objects.items():
+        for obj in items:
+            obj.viewer_liked = obj.pk in liked[kind]
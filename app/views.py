@@ -1,133 +1,238 @@
+import asyncio
 import random
+from abc import ABC, abstractmethod
 
 from django.views.generic import TemplateView
-from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from django.shortcuts import redirect, get_object_or_404
-from django.http import HttpRequest, HttpResponse
+from django.urls import reverse
+from django.http import HttpRequest, HttpResponse, Http404, JsonResponse
 from django.contrib import messages, auth
 from django.conf import settings
-from django.db.models import Count, Q
+from django.db.models import Count, Q, F
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
 from django.utils.decorators import method_decorator
 
-from app.models import Question, Answer, Tag, QuestionLike, AnswerLike, UserProfile
-
-def paginate(objects_list, request: HttpRequest, per_page=3):
-    paginator = Paginator(objects_list, per_page)
-    page_number = request.GET.get('page', 1)
-
-    try:
-        page = paginator.page(page_number)
-    except PageNotAnInteger:
-        page = paginator.page(1)
-    except EmptyPage:
-        page = paginator.page(paginator.num_pages)
-
-    return page
+from app.models import Question, Answer, Tag, QuestionTag, UserProfile
+from app.sidebar import get_snapshot as get_sidebar_snapshot
+from app.pagination import paginate, apaginate
+from app.search import search_questions, index_question
+from app.aio import run_query, gather
+from app.readmodels import question_detail
+from app import authcache, avatars, conditional, signals, viewer, votes
 
 class BaseView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context.update(self.get_layout_context(get_sidebar_snapshot()))
+        return context
 
-        popular_tags = Tag.objects.annotate(
-            question_count=Count('question')
-        ).order_by('-question_count')[:10]
-
-        best_members = UserProfile.objects.select_related('user').annotate(
-            answer_count=Count('user__answer'),
-            question_count=Count('user__questions')
-        ).order_by('-answer_count', '-question_count')[:5]
-
-        context.update({
-            'members': [member.user for member in best_members],
-            'tags': [tag.name for tag in popular_tags],
-            'user': {
-                'is_authenticated': self.request.user.is_authenticated,
-                'username': self.request.user.username if self.request.user.is_authenticated else 'Guest'
-            },
+    def get_layout_context(self, sidebar):
+        return {
+            'members': sidebar['members'],
+            'tags': sidebar['tags'],
             'USER_FILES_URL': settings.USER_FILES_URL,
-        })
-        return context
+        }
+
+
+class AsyncReadView(BaseView, ABC):
+    """
+    Страница только для чтения с асинхронным обработчиком.
+
+    Пользователь, сайдбар и данные самой страницы (get_page_context) запрашиваются одновременно,
+    так что под ASGI медленный клиент или запрос не занимает поток воркера.
+
+    Страница с областями изменений (change_scopes) получает ETag и Last-Modified, а на условный
+    GET с той же версией отвечает 304 до запросов данных страницы и рендеринга.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        scopes = self.change_scopes(**kwargs)
+        changed = None
+        if scopes:
+            scopes += [conditional.SITE_SCOPE, *await conditional.aviewer_scopes(request)]
+            # Отметки читаются до данных страницы: изменение во время рендеринга даст новую версию
+            changed = await run_query(conditional.changed_at, *scopes)
+        if changed is not None and conditional.is_conditional(request):
+            updated_at, sidebar = await gather((self.get_updated_at, kwargs), (get_sidebar_snapshot,))
+            validators = conditional.Validators(request, changed, updated_at, sidebar['built_at'])
+            not_modified = validators.not_modified(request)
+            if not_modified is not None:
+                return not_modified
+
+        # Общая задача, чтобы get_page_context мог дождаться пользователя без повторной загрузки сессии
+        self.user_task = asyncio.ensure_future(request.auser())
+
+        user, sidebar, page_context = await asyncio.gather(
+            self.user_task,
+            run_query(get_sidebar_snapshot),
+            self.get_page_context(**kwargs),
+        )
 
+        # Пользователь уже загружен, шаблону незачем читать сессию ещё раз
+        request.user = user
 
-class IndexView(BaseView):
-    template_name = 'index.html'
-    paginate_by = 3
+        context = super(BaseView, self).get_context_data(**kwargs)
+        context.update(self.get_layout_context(sidebar))
+        context.update(page_context)
+        response = self.render_to_response(context)
+        if changed is not None:
+            updated_at = self.get_updated_at(kwargs, page_context)
+            conditional.Validators(request, changed, updated_at, sidebar['built_at']).apply(request, response)
+        return response
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+    @abstractmethod
+    async def get_page_context(self, **kwargs):
+        """Данные страницы для шаблона; выполняется одновременно с загрузкой пользователя и сайдбара"""
 
-        questions = Question.objects.new_questions()
+    def change_scopes(self, **kwargs):
+        """Области app.conditional, от которых зависит страница; пусто - без ETag и Last-Modified"""
+        return []
 
-        page = paginate(questions, self.request, self.paginate_by)
-        context['page'] = page
-        context['questions'] = page.object_list
+    def get_updated_at(self, kwargs, page_context=None):
+        """Время правки объекта страницы: из загруженных данных или отдельным запросом для условного GET"""
+        return None
 
-        return context
+    async def overlay_viewer(self, **objects):
+        """Лайки пользователя на объектах страницы одним запросом, см. viewer.overlay"""
+        await run_query(viewer.overlay, await self.user_task, **objects)
 
 
-class HotQuestionsView(BaseView):
+class IndexView(AsyncReadView):
     template_name = 'index.html'
+    paginate_by = 3
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+    def change_scopes(self, **kwargs):
+        return [conditional.FEED_SCOPE]
 
-        questions = Question.objects.best_questions()
+    async def get_page_context(self, **kwargs):
+        # Теги нужны только карточкам, которых нет в кэше фрагментов
+        questions = Question.objects.new_questions().prefetch_related(None)
+        page = await apaginate(questions, self.request, self.paginate_by)
+        await self.overlay_viewer(question=page.object_list)
+        return {
+            'page': page,
+            'questions': page.object_list,
+        }
 
-        page = paginate(questions, self.request, 3)
-        context['page'] = page
-        context['questions'] = page.object_list
 
-        return context
+class HotQuestionsView(AsyncReadView):
+    template_name = 'index.html'
+
+    def change_scopes(self, **kwargs):
+        return [conditional.FEED_SCOPE]
+
+    async def get_page_context(self, **kwargs):
+        questions = Question.objects.hot_questions().prefetch_related(None)
+        page = await apaginate(questions, self.request, 3)
+        await self.overlay_viewer(question=page.object_list)
+        return {
+            'page': page,
+            'questions': page.object_list,
+        }
 
 
-class TagQuestionsView(BaseView):
+class TagQuestionsView(AsyncReadView):
     template_name = 'index.html'
     paginate_by = 3
 
+    def change_scopes(self, **kwargs):
+        return [conditional.FEED_SCOPE]
+
+    async def get_page_context(self, **kwargs):
+        tag_value = kwargs.get('tag_name', '')
+        tag_names = list(dict.fromkeys(name for name in tag_value.split('+') if name))
+        found = {tag.name: tag async for tag in Tag.objects.filter(name__in=[tag_value, *tag_names])}
+        if tag_value in found:
+            # Имя тега само может содержать '+', например c++
+            tags = [found[tag_value]]
+        else:
+            tags = [found[name] for name in tag_names if name in found]
+            if not tags or len(tags) != len(tag_names):
+                raise Http404("No such tag")
+
+        if len(tags) == 1:
+            postings = QuestionTag.objects.feed(tags[0]).prefetch_related(None)
+            page = await apaginate(postings, self.request, self.paginate_by)
+            questions = [question_tag.question for question_tag in page]
+        else:
+            questions = Question.objects.with_all_tags(tags).prefetch_related(None)
+            page = await apaginate(questions, self.request, self.paginate_by)
+            questions = page.object_list
+
+        await self.overlay_viewer(question=questions)
+        return {
+            'page': page,
+            'questions': questions,
+            'tag_name': '+'.join(tag.name for tag in tags),
+        }
+
+
+class SearchView(BaseView):
+    template_name = 'search.html'
+    paginate_by = 3
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        tag_name = kwargs.get('tag_name')
-        tag = get_object_or_404(Tag, name=tag_name)
-
-        questions = Question.objects.select_related('author').prefetch_related('tags').filter(tags=tag)
+        query = self.request.GET.get('q', '').strip()
+        questions = search_questions(query).prefetch_related(None)
 
         page = paginate(questions, self.request, self.paginate_by)
+        viewer.overlay(self.request.user, question=page.object_list)
         context['page'] = page
         context['questions'] = page.object_list
-        context['tag_name'] = tag.name
+        context['query'] = query
 
         return context
 
 
-class QuestionDetailView(BaseView):
+class QuestionDetailView(AsyncReadView):
     template_name = 'question.html'
+    paginate_by = 4
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
+    def change_scopes(self, **kwargs):
+        return [conditional.question_scope(kwargs.get('question_id'))]
 
-        question_id = kwargs.get('question_id')
-        question = get_object_or_404(
-            Question.objects.select_related('author').prefetch_related('tags'),
-            id=question_id
-        )
+    def get_updated_at(self, kwargs, page_context=None):
+        if page_context is not None:
+            return page_context['question'].updated_at
+        return Question.objects.filter(pk=kwargs.get('question_id')).values_list('updated_at', flat=True).first()
 
-        answers = Answer.objects.filter(question_id=question_id).best_answers()
+    async def get_page_context(self, **kwargs):
+        detail = await question_detail(self.request, kwargs.get('question_id'), self.paginate_by, self.user_task)
 
-        page = paginate(answers, self.request, 4)
-        context['page'] = page
-        context['answers'] = page.object_list
-        context['answers_count'] = answers.count()
-        context['question'] = question
+        return {
+            'page': detail.page,
+            'answers': detail.answers,
+            'answers_count': detail.answers_count,
+            'question': detail.question,
+        }
 
-        if self.request.user.is_authenticated:
-            context['user_liked_question'] = QuestionLike.objects.filter(
-                question=question, user=self.request.user
-            ).exists()
+    async def post(self, request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect('app:login')
 
-        return context
+        question = await run_query(
+            get_object_or_404, Question.objects.only('id', 'created_at'),
+            id=kwargs.get('question_id'),
+        )
+        content = request.POST.get('content', '').strip()
+        if not content:
+            messages.error(request, "Please enter your answer")
+            return redirect('app:question', question_id=question.id)
+
+        answer = await run_query(Answer.objects.create_for_question, question, user, content)
+
+        # Страница нового ответа по его месту в best_answers, без выборки списка ответов
+        rank = await run_query(Answer.objects.best_rank, answer)
+        url = reverse('app:question', kwargs={'question_id': question.id})
+        page = rank // self.paginate_by + 1
+        if page > 1:
+            url = f'{url}?page={page}'
+        return redirect(f'{url}#answer-{answer.id}')
 
 
 class AskQuestionView(BaseView):
@@ -153,14 +258,20 @@ class AskQuestionView(BaseView):
             question = Question.objects.create(
                 title=title,
                 content=text,
-                author=request.user
+                author=request.user,
+                author_avatar=UserProfile.objects.avatar_of(request.user.id)
             )
+            UserProfile.objects.add_activity(request.user.id, questions=1)
 
             if tags_input:
-                tag_names = [tag.strip() for tag in tags_input.split(',')]
-                for tag_name in tag_names:
+                tag_names = dict.fromkeys(tag.strip() for tag in tags_input.split(','))
+                for tag_name in filter(None, tag_names):
                     tag, created = Tag.objects.get_or_create(name=tag_name)
-                    question.tags.add(tag)
+                    question.tags.add(tag, through_defaults={'question_created_at': question.created_at})
+                    Tag.objects.filter(pk=tag.pk).update(questions_count=F('questions_count') + 1)
+
+            index_question(question)
+            signals.question_created.send(sender=Question, question=question)
 
             return redirect('app:question', question_id=question.id)
 
@@ -190,11 +301,20 @@ class SettingsView(BaseView):
         login = request.POST.get("login")
         email = request.POST.get("email")
 
-        if any([login, email]):
+        avatar = request.FILES.get("avatar")
+
+        if any([login, email, avatar]):
             if email and User.objects.filter(email=email).exclude(id=request.user.id).exists():
                 messages.error(request, "Sorry, this email address already registered!")
                 return self.render_to_response(self.get_context_data())
 
+            if avatar:
+                try:
+                    avatar_format = avatars.validate(avatar)
+                except ValidationError as error:
+                    messages.error(request, error.messages[0])
+                    return self.render_to_response(self.get_context_data())
+
             if email:
                 request.user.email = email
             if login:
@@ -203,6 +323,9 @@ class SettingsView(BaseView):
 
             user_profile, created = UserProfile.objects.get_or_create(user=request.user)
             user_profile.save()
+            if avatar:
+                # Миниатюры готовятся в фоне, на карточках аватарка появится после них
+                avatars.save_upload(request.user.id, avatar, avatar_format)
 
             messages.success(request, "Settings updated successfully!")
             return redirect('app:index')
@@ -229,7 +352,7 @@ class LoginView(BaseView):
                 users = UserProfile.objects.select_related('user').all()
                 if users.exists():
                     random_user = random.choice(users)
-                    auth.login(request, random_user.user)
+                    auth.login(request, random_user.user, backend=authcache.BACKEND)
                     return redirect('app:index')
                 else:
                     messages.error(request, "No users available.")
@@ -276,13 +399,21 @@ class SignupView(BaseView):
                 user=user,
             )
 
-            auth.login(request, user)
+            auth.login(request, user, backend=authcache.BACKEND)
             return redirect('app:index')
 
         messages.error(request, "Please fill all required fields")
         return self.render_to_response(self.get_context_data())
 
 
+def wants_json(request):
+    return 'application/json' in request.headers.get('Accept', '')
+
+
+def vote_response(obj, likes_count, liked):
+    return JsonResponse({'id': obj.pk, 'likes_count': likes_count, 'liked': liked})
+
+
 class VoteQuestionView(BaseView):
 
     @method_decorator(login_required)
@@ -290,18 +421,15 @@ class VoteQuestionView(BaseView):
         question_id = kwargs.get('question_id')
         vote_type = request.POST.get('vote_type')
 
-        question = get_object_or_404(Question, id=question_id)
+        question = get_object_or_404(Question.objects.only('id', 'author_id', 'created_at', 'likes_count'), id=question_id)
 
-        existing_like = QuestionLike.objects.filter(
-            question=question, user=request.user
-        ).first()
+        liked = votes.parse_vote_type(vote_type)
+        likes_count = question.likes_count
+        if liked is not None:
+            likes_count = votes.vote(votes.QUESTIONS, question, request.user, liked)
 
-        if vote_type in ['up', 'up_a']:
-            if not existing_like:
-                QuestionLike.objects.create(question=question, user=request.user)
-        elif vote_type in ['down', 'down_a']:
-            if existing_like:
-                existing_like.delete()
+        if wants_json(request):
+            return vote_response(question, likes_count, liked)
 
         if vote_type and vote_type[-1] != 'a':
             return redirect('app:index')
@@ -316,21 +444,17 @@ class VoteAnswerView(BaseView):
         answer_id = kwargs.get('answer_id')
         vote_type = request.POST.get('vote_type')
 
-        answer = get_object_or_404(Answer, id=answer_id)
-        question_id = answer.question.id
+        answer = get_object_or_404(Answer.objects.only('id', 'author_id', 'question_id', 'likes_count'), id=answer_id)
 
-        existing_like = AnswerLike.objects.filter(
-            answer=answer, user=request.user
-        ).first()
+        liked = votes.parse_vote_type(vote_type)
+        likes_count = answer.likes_count
+        if liked is not None:
+            likes_count = votes.vote(votes.ANSWERS, answer, request.user, liked)
 
-        if vote_type == 'up':
-            if not existing_like:
-                AnswerLike.objects.create(answer=answer, user=request.user)
-        elif vote_type == 'down':
-            if existing_like:
-                existing_like.delete()
+        if wants_json(request):
+            return vote_response(answer, likes_count, liked)
 
-        return redirect('app:question', question_id=question_id)
+        return redirect('app:question', question_id=answer.question_id)
 
 
 class LogoutView(BaseView):
@@ -0,0 +1,274 @@
+from abc import ABC, abstractmethod
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from app import signals
+from app.hot import hot_score
+from app.managers import count_subquery
+from app.models import Question, Answer, QuestionLike, AnswerLike, UserProfile
+
+SEQUENCE_KEY = 'votes:seq'
+FLUSHED_KEY = 'votes:flushed'
+STALLED_KEY = 'votes:stalled'
+FLUSH_LOCK_KEY = 'votes:flush-lock'
+
+# Пары (объект, пользователь) в одном DELETE; длинная цепочка OR упирается в глубину выражений SQLite
+DELETE_BATCH_SIZE = 200
+
+
+def log_key(seq):
+    return f'votes:log:{seq}'
+
+
+def intent_key(kind, object_id, user_id):
+    return f'votes:intent:{kind}:{object_id}:{user_id}'
+
+
+def delta_key(kind, object_id):
+    return f'votes:delta:{kind}:{object_id}'
+
+
+def parse_vote_type(vote_type):
+    """True для лайка, False для отмены, None для неизвестного vote_type"""
+    if vote_type in ('up', 'up_a'):
+        return True
+    if vote_type in ('down', 'down_a'):
+        return False
+    return None
+
+
+class VoteTarget(ABC):
+    """Объект, за который голосуют: модель, модель лайков и пересчёт счётчиков"""
+    kind = None
+    model = None
+    like_model = None
+
+    @property
+    def field(self):
+        return f'{self.kind}_id'
+
+    def likes(self, object_id, user_id):
+        return self.like_model.objects.filter(**{self.field: object_id}, user_id=user_id)
+
+    @abstractmethod
+    def add_likes(self, obj, delta):
+        """Изменение счётчика лайков объекта и репутации его автора на delta"""
+
+    @abstractmethod
+    def changed(self, object_ids):
+        """Сигналы об изменении объектов для сброса кэшей"""
+
+    @abstractmethod
+    def recount(self, object_ids):
+        """Точные счётчики объектов после массовой записи голосов"""
+
+
+class QuestionVotes(VoteTarget):
+    kind = 'question'
+    model = Question
+    like_model = QuestionLike
+
+    def add_likes(self, obj, delta):
+        Question.objects.add_likes(obj, delta)
+        UserProfile.objects.add_activity(obj.author_id, likes=delta)
+
+    def changed(self, object_ids):
+        for question_id in object_ids:
+            signals.question_updated.send(sender=Question, question_id=question_id)
+
+    def recount(self, object_ids):
+        likes_count = count_subquery(QuestionLike, 'question')
+        questions = Question.all_objects.filter(pk__in=object_ids)
+        questions.update(likes_count=likes_count, rating=likes_count + F('answers_count'))
+
+        now = timezone.now()
+        questions = list(questions.only('id', 'rating', 'created_at'))
+        for question in questions:
+            question.hot_score = hot_score(question.rating, question.created_at, now)
+        Question.all_objects.bulk_update(questions, ['hot_score'])
+
+
+class AnswerVotes(VoteTarget):
+    kind = 'answer'
+    model = Answer
+    like_model = AnswerLike
+
+    def add_likes(self, obj, delta):
+        Answer.objects.add_likes(obj.pk, delta)
+        UserProfile.objects.add_activity(obj.author_id, likes=delta)
+
+    def changed(self, object_ids):
+        answers = Answer.all_objects.filter(pk__in=object_ids).values_list('pk', 'question_id')
+        for answer_id, question_id in answers:
+            signals.answer_updated.send(sender=Answer, answer_id=answer_id, question_id=question_id)
+
+    def recount(self, object_ids):
+        likes_count = count_subquery(AnswerLike, 'answer')
+        Answer.all_objects.filter(pk__in=object_ids).update(likes_count=likes_count, rating=likes_count)
+
+
+QUESTIONS = QuestionVotes()
+ANSWERS = AnswerVotes()
+TARGETS = {target.kind: target for target in (QUESTIONS, ANSWERS)}
+
+
+def vote(target, obj, user, liked):
+    """Лайк или его отмена; возвращает число лайков объекта с учётом голоса"""
+    if settings.VOTE_BUFFER_ENABLED:
+        return buffer_vote(target, obj, user, liked)
+    return apply_vote(target, obj, user, liked)
+
+
+def apply_vote(target, obj, user, liked):
+    """Запись голоса сразу в БД"""
+    with transaction.atomic():
+        if liked:
+            _, created = target.like_model.objects.get_or_create(**{target.field: obj.pk}, user=user)
+            delta = 1 if created else 0
+        else:
+            delta = -target.likes(obj.pk, user.pk).delete()[0]
+
+        if not delta:
+            return obj.likes_count
+
+        target.add_likes(obj, delta)
+
+    target.changed([obj.pk])
+    return target.model.objects.filter(pk=obj.pk).values_list('likes_count', flat=True).first()
+
+
+def buffer_vote(target, obj, user, liked):
+    """
+    Голос в буфер общего кэша, в БД его запишет flush_votes.
+
+    Последнее намерение пользователя хранится по ключу (объект, пользователь), поэтому повторные
+    клики не меняют счётчик; в журнал попадают только изменения состояния.
+    """
+    key = intent_key(target.kind, obj.pk, user.pk)
+    current = cache.get(key)
+    if current is None:
+        current = target.likes(obj.pk, user.pk).exists()
+
+    if current != liked:
+        ttl = settings.VOTE_BUFFER_TTL
+        cache.set(key, liked, ttl)
+
+        counter = delta_key(target.kind, obj.pk)
+        cache.add(counter, 0, ttl)
+        cache.incr(counter, 1 if liked else -1)
+
+        cache.add(SEQUENCE_KEY, 0, None)
+        seq = cache.incr(SEQUENCE_KEY)
+        cache.set(log_key(seq), (target.kind, obj.pk, user.pk, liked), ttl)
+
+    return obj.likes_count + cache.get(delta_key(target.kind, obj.pk), 0)
+
+
+def read_log(batch_size):
+    """
+    Записи журнала после последнего сброса, номер последней прочитанной и признак остановки на пропуске.
+
+    Номер в журнале выдаётся до записи самой строки, поэтому на пропуске чтение останавливается
+    до следующего сброса; если пропуск остался, запись считается вытесненной из кэша.
+    """
+    flushed = cache.get(FLUSHED_KEY, 0)
+    last = min(cache.get(SEQUENCE_KEY, 0), flushed + batch_size)
+    seqs = range(flushed + 1, last + 1)
+    found = cache.get_many([log_key(seq) for seq in seqs])
+
+    entries = []
+    for seq in seqs:
+        entry = found.get(log_key(seq))
+        if entry is not None:
+            entries.append(entry)
+        elif cache.get(STALLED_KEY) != seq:
+            cache.set(STALLED_KEY, seq, None)
+            return entries, seq - 1, True
+    return entries, last, False
+
+
+def write_votes(entries, batch_size):
+    """Итоговое состояние каждой пары (объект, пользователь) из журнала одним набором массовых запросов"""
+    final = {}
+    for kind, object_id, user_id, liked in entries:
+        final[kind, object_id, user_id] = liked
+
+    touched = {}
+    authors = set()
+    with transaction.atomic():
+        for kind, target in TARGETS.items():
+            votes = [(object_id, user_id, liked) for (k, object_id, user_id), liked in final.items() if k == kind]
+            if not votes:
+                continue
+
+            object_ids = {object_id for object_id, _, _ in votes}
+            existing = set(target.model.all_objects.filter(pk__in=object_ids).values_list('pk', flat=True))
+
+            target.like_model.objects.bulk_create(
+                [
+                    target.like_model(**{target.field: object_id}, user_id=user_id)
+                    for object_id, user_id, liked in votes if liked and object_id in existing
+                ],
+                batch_size=batch_size,
+                ignore_conflicts=True,
+            )
+
+            unlikes = [(object_id, user_id) for object_id, user_id, liked in votes if not liked]
+            for start in range(0, len(unlikes), DELETE_BATCH_SIZE):
+                condition = Q()
+                for object_id, user_id in unlikes[start:start + DELETE_BATCH_SIZE]:
+                    condition |= Q(**{target.field: object_id}, user_id=user_id)
+                target.like_model.objects.filter(condition).delete()
+
+            target.recount(existing)
+            touched[target] = existing
+            authors.update(target.model.all_objects.filter(pk__in=existing).values_list('author_id', flat=True))
+
+        UserProfile.objects.recount(UserProfile.objects.filter(user_id__in=authors))
+
+    for target, object_ids in touched.items():
+        target.changed(object_ids)
+    return len(final)
+
+
+def forget_deltas(entries):
+    """Ожидающая разница счётчиков записанных голосов теперь в БД"""
+    deltas = Counter()
+    for kind, object_id, _, liked in entries:
+        deltas[kind, object_id] += 1 if liked else -1
+
+    for (kind, object_id), delta in deltas.items():
+        if delta:
+            try:
+                cache.decr(delta_key(kind, object_id), delta)
+            except ValueError:
+                pass
+
+
+def flush_votes(batch_size=None):
+    """Сброс буфера голосов в БД; возвращает число записанных пар (объект, пользователь)"""
+    batch_size = batch_size or settings.VOTE_FLUSH_BATCH_SIZE
+    if not cache.add(FLUSH_LOCK_KEY, True, settings.VOTE_FLUSH_LOCK_TIMEOUT):
+        return 0
+
+    written = 0
+    try:
+        while True:
+            flushed = cache.get(FLUSHED_KEY, 0)
+            entries, last, stalled = read_log(batch_size)
+            if entries:
+                written += write_votes(entries, batch_size)
+                forget_deltas(entries)
+            cache.set(FLUSHED_KEY, last, None)
+
+            if stalled or last - flushed < batch_size:
+                break
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+
+    return written
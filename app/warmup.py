@@ -0,0 +1,52 @@
+import os
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+from app.sidebar import get_snapshot
+
+
+def warm_databases():
+    """
+    Соединение с каждой БД до первого запроса.
+
+    С пулом ждём, пока он наберёт min_size соединений; без пула соединение только проверяется
+    и закрывается: под ASGI запросы идут в других потоках со своими соединениями.
+    """
+    for connection in connections.all():
+        connection.ensure_connection()
+        pool = getattr(connection, 'pool', None)
+        if pool is not None:
+            pool.wait()
+        connection.close()
+
+
+def warm_templates():
+    """Компиляция шаблонов проекта в кэш загрузчика"""
+    count = 0
+    for directory in settings.TEMPLATES[0]['DIRS']:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if name.endswith('.html'):
+                    get_template(os.path.relpath(os.path.join(root, name), directory))
+                    count += 1
+    return count
+
+
+def warm_up():
+    """Прогрев процесса перед первым запросом; возвращает время каждого шага в мс"""
+    timings = {}
+    steps = (
+        ('db', warm_databases),
+        ('urls', lambda: get_resolver().reverse_dict),
+        ('templates', warm_templates),
+        ('sidebar', get_snapshot),
+    )
+    for name, step in steps:
+        started = time.perf_counter()
+        step()
+        timings[name] = round((time.perf_counter() - started) * 1000, 2)
+    return timings
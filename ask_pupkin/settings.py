@@ -10,7 +10,7 @@ PROJECT_NAME = "ask_pupkin"
 
 SECRET_KEY = os.getenv("SECRET_KEY", "!secret_key!")
 
-DEBUG = os.getenv("DEBUG", "False")
+DEBUG = os.getenv("DEBUG", "False") == "True"
 
 ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS", "localhost,127.0.0.1").split(",")
 
@@ -27,6 +27,9 @@ INSTALLED_APPS += [
 ]
 
 MIDDLEWARE = [
+    'app.middleware.StaticFilesMiddleware',
+    'app.middleware.RequestMetricsMiddleware',
+    'app.middleware.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -34,6 +37,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'app.middleware.PageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'ask_pupkin.urls'
@@ -68,6 +72,112 @@ DATABASES = {
     }
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    # Стандартный бэкенд, который пишет время подключения и ожидания пула в метрики запроса
+    DATABASES['default']['ENGINE'] = 'app.backends.postgresql'
+
+if os.getenv('DB_POOL', 'False') == 'True':
+    # Пул psycopg 3 в каждом процессе: всего до WEB_CONCURRENCY * DB_POOL_MAX_SIZE соединений
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        },
+    }
+else:
+    # Постоянные соединения; под ASGI каждый запрос идёт в новом потоке, там лучше пул
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+DATABASES['default']['CONN_HEALTH_CHECKS'] = os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Писатели сразу берут блокировку на запись, иначе параллельные голоса падают с "database is locked"
+    DATABASES['default']['OPTIONS'] = {'transaction_mode': 'IMMEDIATE', 'timeout': 20}
+
+# Реплики для чтения: хосты PostgreSQL (для SQLite - файлы БД) через запятую
+REPLICA_DATABASES = []
+for number, replica in enumerate(filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1):
+    alias = f'replica_{number}'
+    location = 'NAME' if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3' else 'HOST'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        location: replica.strip(),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        # В тестах реплика - то же соединение, что и мастер
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['app.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', '5'))
+REPLICA_PIN_COOKIE_NAME = 'db_pin'
+REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', '5'))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_LAG_CHECK_INTERVAL', '5'))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Сессии и пользователь сессии читаются из кэша, без запросов к БД на каждой странице
+SESSION_ENGINE = os.getenv('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+# ModelBackend остаётся для сессий, созданных до включения кэша: иначе их пользователи вышли бы из системы
+AUTHENTICATION_BACKENDS = ['app.authcache.CachedModelBackend', 'django.contrib.auth.backends.ModelBackend']
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '300'))
+
+SIDEBAR_CACHE_TTL = int(os.getenv('SIDEBAR_CACHE_TTL', '300'))
+SIDEBAR_CACHE_STALE_TTL = int(os.getenv('SIDEBAR_CACHE_STALE_TTL', '3600'))
+SIDEBAR_LOCK_TIMEOUT = int(os.getenv('SIDEBAR_LOCK_TIMEOUT', '30'))
+
+# Число объектов для номеров страниц: exact, cached или auto (оценка планировщика PostgreSQL для больших наборов)
+PAGINATION_COUNT_MODE = os.getenv('PAGINATION_COUNT_MODE', 'auto')
+PAGINATION_COUNT_TTL = int(os.getenv('PAGINATION_COUNT_TTL', '60'))
+PAGINATION_ESTIMATE_THRESHOLD = int(os.getenv('PAGINATION_ESTIMATE_THRESHOLD', '10000'))
+
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+
+HOT_GRAVITY = float(os.getenv('HOT_GRAVITY', '1.8'))
+HOT_WINDOW_DAYS = int(os.getenv('HOT_WINDOW_DAYS', '30'))
+
+REQUEST_METRICS = os.getenv('REQUEST_METRICS', 'True') == 'True'
+
+# Асинхронные view выполняют независимые запросы в отдельных потоках со своими соединениями
+ASYNC_PARALLEL_QUERIES = os.getenv('ASYNC_PARALLEL_QUERIES', 'True') == 'True'
+
+# Кэш отрендеренных карточек вопросов и ответов
+FRAGMENT_CACHE_TTL = int(os.getenv('FRAGMENT_CACHE_TTL', '3600'))
+
+# Кэш страниц для анонимных посетителей; счётчики на лентах устаревают не дольше PAGE_CACHE_TTL
+PAGE_CACHE_ENABLED = os.getenv('PAGE_CACHE_ENABLED', 'True') == 'True'
+PAGE_CACHE_TTL = int(os.getenv('PAGE_CACHE_TTL', '60'))
+PAGE_CACHE_BROWSER_TTL = int(os.getenv('PAGE_CACHE_BROWSER_TTL', '0'))
+
+# Буфер голосов в общем кэше (нужен Redis), в БД пишет flush_votes
+VOTE_BUFFER_ENABLED = os.getenv('VOTE_BUFFER_ENABLED', 'False') == 'True'
+VOTE_BUFFER_TTL = int(os.getenv('VOTE_BUFFER_TTL', '86400'))
+VOTE_FLUSH_BATCH_SIZE = int(os.getenv('VOTE_FLUSH_BATCH_SIZE', '1000'))
+VOTE_FLUSH_LOCK_TIMEOUT = int(os.getenv('VOTE_FLUSH_LOCK_TIMEOUT', '60'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'app.metrics': {
+            'handlers': ['console'],
+            # Строка метрик пишется на уровне INFO: INFO включает лог по каждому запросу
+            'level': os.getenv('REQUEST_METRICS_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -93,12 +203,25 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
-if DEBUG:
-    STATICFILES_DIRS = [
-        os.path.join(BASE_DIR, 'static')
-    ]
-else:
-    STATIC_ROOT = os.path.join(BASE_DIR, 'static')
+STATICFILES_DIRS = [
+    os.path.join(BASE_DIR, 'static')
+]
+# Сюда collectstatic складывает файлы с хэшем в имени и их .br/.gz варианты
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'app.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Раздавать STATIC_ROOT из процесса приложения (app.middleware.StaticFilesMiddleware)
+STATIC_SERVE = os.getenv('STATIC_SERVE', 'True') == 'True'
+# Cache-Control для файлов без хэша в имени, у файлов с хэшем - год и immutable
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', 3600))
 
 USER_FILES_URL = '/uploads/'
 USER_FILES_ROOT = os.path.join(BASE_DIR, 'uploads')
@@ -106,6 +229,11 @@ USER_FILES_ROOT = os.path.join(BASE_DIR, 'uploads')
 MEDIA_URL = '/uploads/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'uploads')
 
+# Аватарки (app.avatars): ограничения загрузки и число процессов для миниатюр, 0 - прямо в запросе
+AVATAR_MAX_UPLOAD_SIZE = int(os.getenv('AVATAR_MAX_UPLOAD_SIZE', 2 * 1024 * 1024))
+AVATAR_MAX_SIDE = int(os.getenv('AVATAR_MAX_SIDE', 4096))
+AVATAR_WORKERS = int(os.getenv('AVATAR_WORKERS', 2))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = '/login/'
@@ -1,7 +1,11 @@
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('app.urls')),
-]
\ No newline at end of file
+]
+# В DEBUG загруженные файлы отдаёт runserver, иначе аватарки раздаёт StaticFilesMiddleware
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,28 @@
+import multiprocessing
+import os
+
+# ASGI-воркеры: один процесс обслуживает много одновременных соединений,
+# поэтому процессов нужно примерно по числу ядер, а не 2 * CPU + 1 как у sync-воркеров
+wsgi_app = 'ask_pupkin.asgi:application'
+worker_class = 'uvicorn_worker.UvicornWorker'
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+
+bind = os.getenv('BIND', '0.0.0.0:8000')
+backlog = int(os.getenv('GUNICORN_BACKLOG', '2048'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+
+# Периодический перезапуск воркеров ограничивает рост памяти
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '10000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '1000'))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def post_worker_init(worker):
+    # Соединения с БД, URL, шаблоны и сайдбар готовятся до первого запроса, а не за его счёт
+    from app.warmup import warm_up
+
+    worker.log.info('Worker warmed up: %s', warm_up())
@@ -0,0 +1,37 @@
+// Голосование без перезагрузки страницы: форма отправляется fetch'ем,
+// счётчик обновляется из JSON-ответа. Без JS формы работают как раньше.
+document.addEventListener('submit', function (event) {
+    var form = event.target;
+    if (!form.classList.contains('vote-form')) {
+        return;
+    }
+    event.preventDefault();
+
+    fetch(form.action, {
+        method: 'POST',
+        body: new FormData(form),
+        headers: {'Accept': 'application/json'},
+        credentials: 'same-origin'
+    }).then(function (response) {
+        var type = response.headers.get('Content-Type') || '';
+        if (!response.ok || type.indexOf('application/json') === -1) {
+            // Например, редирект на страницу входа
+            window.location = response.url;
+            return null;
+        }
+        return response.json();
+    }).then(function (data) {
+        if (data === null) {
+            return;
+        }
+        var voting = form.parentElement;
+        var count = voting.querySelector('.vote-count');
+        if (count) {
+            count.textContent = data.likes_count;
+        }
+        var up = voting.querySelector('.vote-up');
+        if (up && data.liked !== null) {
+            up.classList.toggle('voted', data.liked);
+        }
+    });
+});